@@ -0,0 +1,132 @@
+"""
+SSE fan-out: per-client frame buffers, the client registry and the
+dispatcher loop that copies each queued frame to every live client.
+
+This module is strictly typed so it can be compiled with mypyc
+(`mypyc _broadcast.py` in backend/). app.py imports it either way; the
+compiled extension, when built, simply shadows this file.
+"""
+
+import collections
+import itertools
+import queue
+import threading
+from typing import Callable, Deque, Iterator, List, Optional
+
+# Events a client may fall behind by; past that its oldest are dropped
+SSE_BUFFER_SIZE = 4096
+
+
+class SSEClientBuffer:
+    """
+    Pending SSE frames for one connected client.
+
+    deque.append/popleft are atomic under the GIL, so producers and the
+    client's stream share it without a Python-level lock. `ready` wakes
+    the stream after an append — or, for a stream that doesn't block on
+    a thread (the ASGI one), `waker` is called instead.
+    """
+
+    def __init__(self, size: int = SSE_BUFFER_SIZE, waker: Optional[Callable[[], None]] = None) -> None:
+        self._items: Deque[bytes] = collections.deque(maxlen=size)
+        self._size = size
+        self._waker = waker
+        self.ready = threading.Event()
+        # Mirrors `ready`, so a push can test it without a method call
+        self._signalled = False
+        self.dropped = 0
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def push(self, item: bytes) -> None:
+        """Producer side. On a full buffer the oldest item is evicted."""
+        if len(self._items) == self._size:
+            self.dropped += 1
+        self._items.append(item)
+        # Event.set() takes a lock and notifies; only the empty -> non-empty
+        # edge needs it, since the consumer drains everything per wakeup
+        if not self._signalled:
+            self._signalled = True
+            if self._waker is not None:
+                self._waker()
+            else:
+                self.ready.set()
+
+    def rearm(self) -> bool:
+        """
+        Consumer side, once drained: clear `ready`, then report whether an
+        item arrived meanwhile (if so, don't wait on `ready`).
+        """
+        self._signalled = False
+        self.ready.clear()
+        return len(self._items) > 0
+
+    def has_pending(self) -> bool:
+        """Consumer side. True if an item is waiting."""
+        return len(self._items) > 0
+
+    def pop_many(self, limit: int) -> List[bytes]:
+        """Consumer side. Up to `limit` pending items, oldest first (maybe none)."""
+        items: List[bytes] = []
+        taken = 0
+        try:
+            while taken < limit:
+                items.append(self._items.popleft())
+                taken += 1
+        except IndexError:
+            pass
+        return items
+
+
+class SSERegistry:
+    """
+    Connected clients as parallel arrays: `clients[i]` is a buffer and
+    `alive[i]` a one-byte flag. Fan-out scans the flags with
+    itertools.compress (in C) and only touches live buffers. Freed slots
+    are reused from a stack, so connect and disconnect are both O(1).
+    """
+
+    def __init__(self) -> None:
+        self.clients: List[Optional[SSEClientBuffer]] = []
+        self.alive = bytearray()
+        self._free: List[int] = []
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def add(self, client: SSEClientBuffer) -> int:
+        """Register a client; returns its slot."""
+        with self._lock:
+            if self._free:
+                slot = self._free.pop()
+                self.clients[slot] = client
+            else:
+                slot = len(self.clients)
+                self.clients.append(client)
+                self.alive.append(0)
+            # Publish the flag last, so a live slot always has its buffer
+            self.alive[slot] = 1
+            self.count += 1
+        return slot
+
+    def remove(self, slot: int) -> None:
+        """Unregister a slot; the fan-out stops pushing to it."""
+        with self._lock:
+            self.alive[slot] = 0
+            self.clients[slot] = None
+            self._free.append(slot)
+            self.count -= 1
+
+    def live(self) -> Iterator[Optional[SSEClientBuffer]]:
+        """Iterate live client buffers, lock-free."""
+        return itertools.compress(self.clients, self.alive)
+
+
+def dispatch_forever(frames: "queue.SimpleQueue[bytes]", registry: SSERegistry) -> None:
+    """Fan queued SSE frames out to every connected client, in order."""
+    while True:
+        frame = frames.get()
+        for client in registry.live():
+            # A slot being reused can briefly read as live-but-empty
+            if client is not None:
+                client.push(frame)
@@ -3,14 +3,30 @@ Analyze a cloned repository: build file tree, discover test files, detect langua
 """
 
 import os
+from collections import Counter
 
-# Directories to skip when walking the repo
-SKIP_DIRS = {".git", "__pycache__", "node_modules", ".venv", "venv", "env", ".tox", ".pytest_cache"}
+# Directories never descended into — the single prune list for walk_files
+# and the file tree
+SKIP_DIRS = frozenset({".git", "__pycache__", "node_modules", ".venv", "venv", "env", ".tox", ".pytest_cache"})
+
+# detect_language stops walking once one extension has this many files
+LANGUAGE_SAMPLE_LIMIT = 1000
+
+
+def _sorted_entries(path: str) -> list:
+    """List a directory's entries (minus SKIP_DIRS), sorted by name."""
+    # scandir's DirEntry caches the d_type from the directory read, so
+    # is_dir() doesn't cost an extra stat() per child like os.path.isdir
+    with os.scandir(path) as it:
+        return sorted((e for e in it if e.name not in SKIP_DIRS), key=lambda e: e.name)
 
 
 def build_file_tree(repo_path: str, prefix: str = "") -> str:
     """
     Build a text representation of the file tree.
+
+    Iterative depth-first walk with an explicit stack, so deep trees
+    can't hit the recursion limit.
     
     Returns:
         A string like:
@@ -20,55 +36,62 @@ def build_file_tree(repo_path: str, prefix: str = "") -> str:
             └── validator.py
     """
     lines = []
-    entries = sorted(os.listdir(repo_path))
-    # Filter out skip dirs
-    entries = [e for e in entries if e not in SKIP_DIRS]
+    # Each frame: (sorted entries of a directory, next index, line prefix)
+    stack = [(_sorted_entries(repo_path), 0, prefix)]
+
+    while stack:
+        entries, i, pfx = stack.pop()
+        if i >= len(entries):
+            continue
 
-    for i, entry in enumerate(entries):
-        path = os.path.join(repo_path, entry)
-        connector = "└── " if i == len(entries) - 1 else "├── "
-        lines.append(f"{prefix}{connector}{entry}")
+        entry = entries[i]
+        is_last = i == len(entries) - 1
+        connector = "└── " if is_last else "├── "
+        lines.append(f"{pfx}{connector}{entry.name}")
 
-        if os.path.isdir(path):
-            extension = "    " if i == len(entries) - 1 else "│   "
-            subtree = build_file_tree(path, prefix + extension)
-            if subtree:
-                lines.append(subtree)
+        # Resume this directory after the entry's subtree is done
+        stack.append((entries, i + 1, pfx))
+        if entry.is_dir(follow_symlinks=False):
+            extension = "    " if is_last else "│   "
+            stack.append((_sorted_entries(entry.path), 0, pfx + extension))
 
     return "\n".join(lines)
 
 
-def discover_test_files(repo_path: str) -> list:
-    """
-    Find all test files in the repository.
-    Looks for files matching test_*.py or *_test.py patterns.
-    
-    Returns:
-        List of relative paths to test files.
+def walk_files(repo_path: str):
     """
-    test_files = []
-    for root, dirs, files in os.walk(repo_path):
-        # Skip hidden/unwanted dirs
-        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
-        for f in files:
-            if (f.startswith("test_") or f.endswith("_test.py")) and f.endswith(".py"):
-                rel_path = os.path.relpath(os.path.join(root, f), repo_path)
-                test_files.append(rel_path)
-    return sorted(test_files)
-
+    The one repo walker shared by the analyzer, the deterministic fixer and
+    the pipeline: an os.scandir walk (explicit stack, no recursion limit)
+    pruning SKIP_DIRS. Symlinked directories are not followed.
 
-def detect_language(repo_path: str) -> str:
-    """
-    Simple language detection based on file extensions.
+    Yields:
+        (abs_path, rel_path, filename) for every file in the tree.
+        rel_path always uses forward slashes.
     """
-    ext_counts = {}
-    for root, dirs, files in os.walk(repo_path):
-        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
-        for f in files:
-            _, ext = os.path.splitext(f)
-            if ext:
-                ext_counts[ext] = ext_counts.get(ext, 0) + 1
-
+    stack = [(repo_path, "")]
+    while stack:
+        path, rel_prefix = stack.pop()
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir():
+                if entry.name not in SKIP_DIRS and not entry.is_symlink():
+                    stack.append((entry.path, f"{rel_prefix}{entry.name}/"))
+            else:
+                yield entry.path, f"{rel_prefix}{entry.name}", entry.name
+
+
+def _is_test_file(filename: str) -> bool:
+    """True for files matching test_*.py or *_test.py."""
+    # Most files aren't .py, so test that first and short-circuit
+    return filename.endswith(".py") and (filename.startswith("test_") or filename.endswith("_test.py"))
+
+
+def _language_from_counts(ext_counts: Counter) -> str:
+    """Map the most common file extension to a language name."""
     lang_map = {
         ".py": "python",
         ".js": "javascript",
@@ -81,10 +104,36 @@ def detect_language(repo_path: str) -> str:
     if not ext_counts:
         return "unknown"
 
-    top_ext = max(ext_counts, key=ext_counts.get)
+    top_ext = ext_counts.most_common(1)[0][0]
     return lang_map.get(top_ext, "unknown")
 
 
+def discover_test_files(repo_path: str) -> list:
+    """
+    Find all test files in the repository.
+    Looks for files matching test_*.py or *_test.py patterns.
+    
+    Returns:
+        List of relative paths to test files.
+    """
+    return sorted(rel_path for _, rel_path, f in walk_files(repo_path) if _is_test_file(f))
+
+
+def detect_language(repo_path: str) -> str:
+    """
+    Simple language detection based on file extensions.
+    Stops early once one extension passes LANGUAGE_SAMPLE_LIMIT files.
+    """
+    ext_counts = Counter()
+    for _, _, f in walk_files(repo_path):
+        _, ext = os.path.splitext(f)
+        if ext:
+            ext_counts[ext] += 1
+            if ext_counts[ext] > LANGUAGE_SAMPLE_LIMIT:
+                break
+    return _language_from_counts(ext_counts)
+
+
 def infer_test_command(language: str, repo_path: str) -> str:
     """
     Infer the test command based on the language and repo structure.
@@ -116,8 +165,18 @@ def analyze_repo(repo_path: str) -> dict:
         dict with keys: tree, test_files, language, test_command
     """
     tree = build_file_tree(repo_path)
-    test_files = discover_test_files(repo_path)
-    language = detect_language(repo_path)
+
+    # Single walk feeds both test discovery and language detection
+    test_files = []
+    ext_counts = Counter()
+    for _, rel_path, f in walk_files(repo_path):
+        if _is_test_file(f):
+            test_files.append(rel_path)
+        _, ext = os.path.splitext(f)
+        if ext:
+            ext_counts[ext] += 1
+    test_files.sort()
+    language = _language_from_counts(ext_counts)
     test_command = infer_test_command(language, repo_path)
 
     print(f"[ANALYZER] Language: {language}")
@@ -9,42 +9,86 @@ import time
 import stat
 
 
+# History depth for clones — GIT_CLONE_DEPTH=0 fetches the full history
+GIT_CLONE_DEPTH = int(os.environ.get("GIT_CLONE_DEPTH", "1"))
+# Partial-clone filter for clones that fetch history (depth 0 or > 1):
+# only HEAD's blobs are downloaded at checkout, older ones on demand.
+# A depth-1 clone needs every blob it fetches, so it skips the filter.
+# Servers that don't support filtering just ignore it
+GIT_CLONE_FILTER = "blob:none"
+
+
 def _force_remove_readonly(func, path, exc_info):
     """Handle read-only files on Windows during rmtree."""
     os.chmod(path, stat.S_IWRITE)
     func(path)
 
 
+def _wait_until_gone(path, timeout=3.0):
+    """Poll with exponential backoff (from 50ms) until path disappears."""
+    delay = 0.05
+    deadline = time.monotonic() + timeout
+    while os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(delay)
+        delay *= 2
+    return not os.path.exists(path)
+
+
 def _remove_dir(path):
     """Remove a directory, handling Windows lock issues."""
-    try:
-        shutil.rmtree(path, onerror=_force_remove_readonly)
-    except Exception:
-        # Fallback: use cmd /c rmdir on Windows
-        try:
-            subprocess.run(
-                ["cmd", "/c", "rmdir", "/s", "/q", path],
-                capture_output=True, text=True, timeout=30,
-            )
-            time.sleep(1)
-        except Exception:
-            pass
-    # If still exists, wait and retry once
-    if os.path.exists(path):
-        time.sleep(2)
+    if os.name == "posix":
+        # No file locking to wait out — a single rmtree either works or doesn't
         try:
             shutil.rmtree(path, onerror=_force_remove_readonly)
         except Exception as e:
             print(f"[CLONE] Warning: Could not fully remove {path}: {e}")
+        return
+
+    # Windows: cmd's rmdir is much faster than rmtree's per-file Python calls
+    try:
+        subprocess.run(
+            ["cmd", "/c", "rmdir", "/s", "/q", path],
+            capture_output=True, text=True, timeout=30,
+        )
+    except Exception:
+        pass
+    if _wait_until_gone(path):
+        return
+
+    # Fallback: files were still locked — retry with rmtree
+    try:
+        shutil.rmtree(path, onerror=_force_remove_readonly)
+    except Exception as e:
+        print(f"[CLONE] Warning: Could not fully remove {path}: {e}")
+    _wait_until_gone(path)
+
+
+def _clone_command(github_url: str, repo_path: str, clone_opts: dict = None) -> list:
+    """
+    Build the `git clone` argv from clone_opts (keys: depth, filter). The
+    filter defaults to GIT_CLONE_FILTER, except on depth-1 clones.
+    """
+    opts = clone_opts or {}
+    depth = opts.get("depth", GIT_CLONE_DEPTH)
+    clone_filter = opts.get("filter", GIT_CLONE_FILTER if depth != 1 else None)
+
+    cmd = ["git", "clone", "--single-branch", "--no-tags"]
+    if depth:
+        cmd += ["--depth", str(depth)]
+    if clone_filter:
+        cmd += [f"--filter={clone_filter}"]
+    return cmd + [github_url, repo_path]
 
 
-def clone_repo(github_url: str, workspace_dir: str) -> str:
+def clone_repo(github_url: str, workspace_dir: str, clone_opts: dict = None) -> str:
     """
     Clone a GitHub repository into workspace_dir.
     
     Args:
         github_url: The HTTPS URL of the GitHub repository.
         workspace_dir: Base directory where repos are cloned.
+        clone_opts: Optional overrides — "depth" (0/None = full history)
+            and "filter" (e.g. "blob:none"; None disables it).
     
     Returns:
         The absolute path to the cloned repository.
@@ -60,8 +104,9 @@ def clone_repo(github_url: str, workspace_dir: str) -> str:
     os.makedirs(workspace_dir, exist_ok=True)
 
     print(f"[CLONE] Cloning {github_url} into {repo_path}...")
+    # Only the HEAD snapshot is needed to fix bugs — skip history and tags
     result = subprocess.run(
-        ["git", "clone", github_url, repo_path],
+        _clone_command(github_url, repo_path, clone_opts),
         capture_output=True,
         text=True,
         timeout=120,
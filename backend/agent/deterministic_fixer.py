@@ -6,11 +6,47 @@ This module is called BEFORE the LLM, so only genuinely hard bugs
 (LOGIC, TYPE_ERROR) are sent to the LLM — saving cost and time.
 """
 
+import io
 import os
 import re
+import sys
+import shutil
 import ast
+import json
+import fnmatch
+import hashlib
+import tokenize
 import subprocess
 import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from agent.analyzer import SKIP_DIRS, walk_files
+
+# Persistent caches live in the workspace, outside the cloned repo, so
+# `git add -A` never picks them up and they survive re-clones.
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "workspace", ".deterministic_cache")
+AST_CACHE_DIR = os.path.join(CACHE_DIR, "source-ast-cache")
+RUNS_CACHE_DIR = os.path.join(CACHE_DIR, "runs")
+
+# Bump when the parse cache's entry format or _find_unused_imports'
+# results change; older cache files are then simply not read
+PARSE_CACHE_VERSION = 3
+
+# Below this many files, worker start-up costs more than parsing serially
+PARALLEL_PARSE_THRESHOLD = 32
+
+# Statements that must end with ':' (def/class/if/elif/else/for/while/with/try/except/finally)
+_COLON_RE = re.compile(r"^\s*(def\s+\w+\(.*\)|class\s+\w+.*|if\s+.+|elif\s+.+|else|for\s+.+|while\s+.+|with\s+.+|try|except.*|finally)\s*$")
+# "import xyz" / "from xyz import ..."
+_IMPORT_ANY = re.compile(r"^(?:import\s+(?P<imp>[\w\.]+)|from\s+(?P<frm>[\w\.]+)\s+import)")
+
+# "# type: ..." comments (but not "# type: ignore"); matched on the raw
+# bytes so type comments never change what counts as a syntax error
+_TYPE_COMMENT_RE = re.compile(rb"#\s*type:\s*(?!ignore\b)([^#\r\n]+)")
+
+# Third-party modules find_spec has already located in this process
+_FOUND_MODULES = set()
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -21,36 +57,255 @@ def _log(tag, msg):
     print(f"[DETERMINISTIC] [{tag}] {msg}")
 
 
+# ═══════════════════════════════════════════════════════════════════
+#  FILE DISCOVERY (single walk shared by all detectors)
+# ═══════════════════════════════════════════════════════════════════
+
+def _iter_py_files(repo_path: str):
+    """
+    The .py files from the shared repo walk (analyzer.walk_files).
+
+    Yields:
+        (abs_path, rel_path, is_test) for every .py file.
+        rel_path always uses forward slashes.
+    """
+    for abs_path, rel_path, fname in walk_files(repo_path):
+        if fname.endswith(".py"):
+            is_test = fname == "conftest.py" or fname.startswith("test_") or fname.endswith("_test.py")
+            yield abs_path, rel_path, is_test
+
+
 # ═══════════════════════════════════════════════════════════════════
 #  1. SYNTAX ERROR DETECTION & FIX (ast.parse)
 # ═══════════════════════════════════════════════════════════════════
 
-def _detect_syntax_errors(repo_path: str) -> list:
+def _parse_cache_path() -> str:
+    """
+    Parse verdicts depend on the grammar, so key the cache file by Python
+    version — and by PARSE_CACHE_VERSION, so a cache written in an older
+    format (v1 was a plain list of clean digests) is never loaded.
+    """
+    py = f"{sys.version_info[0]}{sys.version_info[1]}"
+    return os.path.join(AST_CACHE_DIR, f"clean-v{PARSE_CACHE_VERSION}-py{py}.json")
+
+
+def _load_parse_cache() -> dict:
+    """
+    Load the cache of sources known to parse cleanly.
+
+    Returns:
+        {sha256: [[lineno, import_name], ...]} — the unused imports found
+        in that source, so cache hits can skip ast.parse entirely.
+    """
+    try:
+        with open(_parse_cache_path(), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_parse_cache(parse_cache: dict):
+    """Persist the clean-parse results for the next run."""
+    try:
+        os.makedirs(AST_CACHE_DIR, exist_ok=True)
+        with open(_parse_cache_path(), "w", encoding="utf-8") as f:
+            json.dump(parse_cache, f)
+    except OSError as e:
+        _log("WARN", f"Could not save parse cache: {e}")
+
+
+def _names_in_type_source(text: str, mode: str = "eval") -> set:
+    """
+    Names referenced by a type expression held in a string (a quoted
+    annotation or a type comment), including strings nested inside it.
+    Text that doesn't parse references nothing.
+    """
+    try:
+        tree = ast.parse(text.strip(), mode=mode)
+    except (SyntaxError, ValueError):
+        return set()
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            names.add(node.id)
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+            names |= _names_in_type_source(node.value)
+    return names
+
+
+def _find_unused_imports(tree, type_comments=()) -> list:
+    """
+    Find import statements none of whose bound names are ever referenced.
+
+    Like pyflakes, names used only in quoted annotations (`x: "Bar"`,
+    `-> "List[Bar]"`) or in `# type:` comments (the type_comments texts)
+    count as used, so TYPE_CHECKING-only imports are kept.
+
+    Only single-line statements are reported, and a statement is only
+    reported when ALL of its names are unused — the fix deletes the
+    whole line, which must not take a used name with it.
+
+    Returns:
+        [[lineno, import_name], ...] with import_name formatted like
+        flake8's F401 message ('os.path', 'collections.OrderedDict').
+    """
+    imports = []
+    used = set()
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.asname or alias.name.split(".")[0] for alias in node.names]
+            imports.append((node, names, node.names[0].name))
+        elif isinstance(node, ast.ImportFrom):
+            if node.module == "__future__" or any(alias.name == "*" for alias in node.names):
+                continue
+            module = "." * node.level + (node.module or "")
+            names = [alias.asname or alias.name for alias in node.names]
+            imports.append((node, names, f"{module}.{node.names[0].name}"))
+        elif isinstance(node, ast.Name):
+            used.add(node.id)
+        elif isinstance(node, (ast.arg, ast.AnnAssign, ast.FunctionDef, ast.AsyncFunctionDef)):
+            annotation = node.returns if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) else node.annotation
+            if annotation is not None:
+                for sub in ast.walk(annotation):
+                    if isinstance(sub, ast.Constant) and isinstance(sub.value, str):
+                        used |= _names_in_type_source(sub.value)
+        elif isinstance(node, (ast.Assign, ast.AugAssign)):
+            # Names exported via __all__ count as used
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            if any(isinstance(t, ast.Name) and t.id == "__all__" for t in targets):
+                if isinstance(node.value, (ast.List, ast.Tuple)):
+                    used.update(
+                        elt.value for elt in node.value.elts
+                        if isinstance(elt, ast.Constant) and isinstance(elt.value, str)
+                    )
+
+    for comment in type_comments:
+        # Function signature comments look like "(int, Bar) -> str"
+        used |= _names_in_type_source(comment, "func_type" if comment.lstrip().startswith("(") else "eval")
+
+    unused = []
+    for node, names, display in imports:
+        if node.lineno != node.end_lineno:
+            continue
+        if not any(name in used for name in names):
+            unused.append([node.lineno, display])
+    return unused
+
+
+def _decode_source(data: bytes) -> str:
+    """
+    Decode source bytes the way the parser does: honour a PEP 263 coding
+    cookie or BOM, defaulting to UTF-8. Undecodable bytes are replaced
+    rather than raising — the text is only used to build a fix.
+    """
+    try:
+        encoding, _ = tokenize.detect_encoding(io.BytesIO(data).readline)
+    except SyntaxError:
+        encoding = "utf-8"
+    return data.decode(encoding, errors="replace")
+
+
+# Snapshot of the parse cache, installed once per worker process
+_worker_parse_cache = {}
+
+
+def _init_parse_worker(parse_cache):
+    global _worker_parse_cache
+    _worker_parse_cache = parse_cache
+
+
+def _parse_one(item, parse_cache=None):
+    """
+    Parse a single file. Module-level so ProcessPoolExecutor can pickle it.
+
+    Returns:
+        (fpath, rel_path, digest, error, unused) where error is None for a
+        clean parse or cache hit, else (line_no, msg, source); unused is
+        the _find_unused_imports() result for clean sources.
+    """
+    fpath, rel_path = item
+    if parse_cache is None:
+        parse_cache = _worker_parse_cache
+
+    with open(fpath, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    if digest in parse_cache:
+        return fpath, rel_path, digest, None, parse_cache[digest]
+
+    # Parse the raw bytes — ast.parse applies the file's own encoding
+    # declaration, and the text (and its line list) is only needed to
+    # build a fix, so don't decode on the common clean path
+    try:
+        tree = ast.parse(data, filename=fpath)
+    except SyntaxError as e:
+        source = _decode_source(data)
+        return fpath, rel_path, digest, (e.lineno or 0, str(e.msg) if e.msg else "", source), []
+    type_comments = (
+        [m.group(1).decode("utf-8", "replace") for m in _TYPE_COMMENT_RE.finditer(data)]
+        if b"type:" in data else ()
+    )
+    return fpath, rel_path, digest, None, _find_unused_imports(tree, type_comments)
+
+
+def _parse_all(py_files: list, parse_cache: dict) -> list:
     """
-    Try to ast.parse() every .py file. If it fails, extract the
+    Parse every file once, across a process pool when there are enough
+    of them. The results are shared by the syntax and linting phases.
+
+    Files whose SHA256 is in parse_cache are known to parse cleanly and
+    skip ast.parse. Only clean results are cached — files with errors are
+    always re-parsed so line numbers are fresh. New clean results are
+    added to parse_cache in place.
+
+    Returns:
+        List of (fpath, rel_path, is_test, error, unused) tuples.
+    """
+    items = [(fpath, rel_path) for fpath, rel_path, _ in py_files]
+    results = None
+
+    if len(items) >= PARALLEL_PARSE_THRESHOLD:
+        try:
+            with ProcessPoolExecutor(
+                max_workers=os.cpu_count(),
+                initializer=_init_parse_worker,
+                initargs=(parse_cache,),
+            ) as executor:
+                results = list(executor.map(_parse_one, items, chunksize=8))
+        except (OSError, BrokenProcessPool, AssertionError) as e:
+            # AssertionError: started from a daemonic process, which can't
+            # have children
+            _log("WARN", f"Parallel parse unavailable ({e!r}) — parsing serially")
+
+    if results is None:
+        results = [_parse_one(item, parse_cache) for item in items]
+
+    parsed = []
+    for (fpath, rel_path, digest, error, unused), (_, _, is_test) in zip(results, py_files):
+        if error is None:
+            parse_cache[digest] = unused
+        parsed.append((fpath, rel_path, is_test, error, unused))
+    return parsed
+
+
+def _detect_syntax_errors(parsed: list) -> list:
+    """
+    Collect the files that failed ast.parse() (see _parse_all), extract the
     SyntaxError location and try to auto-fix common patterns.
     """
     fixes = []
-    for root, dirs, files in os.walk(repo_path):
-        dirs[:] = [d for d in dirs if d not in {".git", "__pycache__", "node_modules", ".venv", "venv", ".pytest_cache", ".tox"}]
-        for fname in files:
-            if not fname.endswith(".py"):
-                continue
-            fpath = os.path.join(root, fname)
-            rel_path = os.path.relpath(fpath, repo_path).replace("\\", "/")
-
-            try:
-                with open(fpath, "r", encoding="utf-8") as f:
-                    source = f.read()
-                ast.parse(source)
-            except SyntaxError as e:
-                line_no = e.lineno or 0
-                msg = str(e.msg) if e.msg else ""
-                _log("SYNTAX", f"SyntaxError in {rel_path}:{line_no} — {msg}")
-
-                fix = _try_fix_syntax(fpath, rel_path, source, line_no, msg)
-                if fix:
-                    fixes.append(fix)
+    for fpath, rel_path, _, error, _ in parsed:
+        if error is None:
+            continue
+
+        line_no, msg, source = error
+        _log("SYNTAX", f"SyntaxError in {rel_path}:{line_no} — {msg}")
+
+        fix = _try_fix_syntax(fpath, rel_path, source, line_no, msg)
+        if fix:
+            fixes.append(fix)
 
     return fixes
 
@@ -65,8 +320,7 @@ def _try_fix_syntax(fpath, rel_path, source, line_no, error_msg):
 
     # Pattern 1: Missing colon after def/class/if/elif/else/for/while/with/try/except/finally
     # e.g. "def validate_email(email)" → "def validate_email(email):"
-    colon_keywords = r"^\s*(def\s+\w+\(.*\)|class\s+\w+.*|if\s+.+|elif\s+.+|else|for\s+.+|while\s+.+|with\s+.+|try|except.*|finally)\s*$"
-    if re.match(colon_keywords, line) and not line.rstrip().endswith(":"):
+    if _COLON_RE.match(line) and not line.rstrip().endswith(":"):
         old_code = line.rstrip()
         new_code = old_code + ":"
         _log("SYNTAX", f"  Fix: adding missing colon → {new_code}")
@@ -79,12 +333,13 @@ def _try_fix_syntax(fpath, rel_path, source, line_no, error_msg):
             "description": f"Add missing colon at end of statement",
         }
 
-    # Pattern 2: Missing closing parenthesis/bracket
-    if "expected ':'" in error_msg.lower() or "expected ':'":
+    # Pattern 2: Missing colon reported on the line after the statement
+    error_msg = error_msg.lower()
+    if "expected ':'" in error_msg or "invalid syntax" in error_msg:
         # Check the line before for missing colon
         if line_no >= 2:
             prev_line = lines[line_no - 2]
-            if re.match(colon_keywords, prev_line) and not prev_line.rstrip().endswith(":"):
+            if _COLON_RE.match(prev_line) and not prev_line.rstrip().endswith(":"):
                 old_code = prev_line.rstrip()
                 new_code = old_code + ":"
                 _log("SYNTAX", f"  Fix: adding missing colon on prev line → {new_code}")
@@ -104,7 +359,7 @@ def _try_fix_syntax(fpath, rel_path, source, line_no, error_msg):
 #  2. IMPORT ERROR DETECTION & FIX (importlib)
 # ═══════════════════════════════════════════════════════════════════
 
-def _detect_import_errors(repo_path: str) -> list:
+def _detect_import_errors(repo_path: str, py_files: list) -> list:
     """
     Scan all .py files for import statements.
     Check if the imported module actually exists (using importlib).
@@ -114,101 +369,163 @@ def _detect_import_errors(repo_path: str) -> list:
 
     # Build a set of all local module names (files and directories in repo root + src/)
     local_modules = set()
-    for entry in os.listdir(repo_path):
-        entry_path = os.path.join(repo_path, entry)
-        if os.path.isdir(entry_path) and entry not in {".git", "__pycache__", "node_modules", ".venv", "venv", ".pytest_cache", ".tox"}:
-            local_modules.add(entry)
-        elif entry.endswith(".py"):
-            local_modules.add(entry[:-3])  # Remove .py extension
+    with os.scandir(repo_path) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in SKIP_DIRS:
+                    local_modules.add(entry.name)
+            elif entry.name.endswith(".py"):
+                local_modules.add(entry.name[:-3])  # Remove .py extension
 
     # Also check src/ subdirectory for modules
     src_dir = os.path.join(repo_path, "src")
     if os.path.isdir(src_dir):
-        for entry in os.listdir(src_dir):
-            if entry.endswith(".py") and entry != "__init__.py":
-                local_modules.add(entry[:-3])
-            elif os.path.isdir(os.path.join(src_dir, entry)) and entry != "__pycache__":
-                local_modules.add(entry)
+        with os.scandir(src_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".py") and entry.name != "__init__.py":
+                    local_modules.add(entry.name[:-3])
+                elif entry.is_dir(follow_symlinks=False) and entry.name != "__pycache__":
+                    local_modules.add(entry.name)
 
     _log("IMPORT", f"Local modules detected: {sorted(local_modules)}")
 
-    for root, dirs, files in os.walk(repo_path):
-        dirs[:] = [d for d in dirs if d not in {".git", "__pycache__", "node_modules", ".venv", "venv", ".pytest_cache", ".tox"}]
-        for fname in files:
-            if not fname.endswith(".py"):
+    # find_spec probes every sys.path entry, so resolve each module once.
+    # Misses are only memoized per scan — a later pip install may add them.
+    spec_cache = {}
+
+    for fpath, rel_path, is_test in py_files:
+        # Skip test files — they import project modules which are always valid
+        if is_test:
+            continue
+
+        try:
+            with open(fpath, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except Exception:
+            continue
+
+        for i, line in enumerate(lines):
+            stripped = line.strip()
+            if not stripped or stripped.startswith("#"):
                 continue
-            # Skip test files — they import project modules which are always valid
-            if fname.startswith("test_") or fname.endswith("_test.py") or fname == "conftest.py":
+
+            # Match "import xyz" or "from xyz import ..."
+            m = _IMPORT_ANY.match(stripped)
+            if not m:
                 continue
+            module_name = m.group("imp") or m.group("frm")
 
-            fpath = os.path.join(root, fname)
-            rel_path = os.path.relpath(fpath, repo_path).replace("\\", "/")
+            # Skip relative imports
+            if module_name.startswith("."):
+                continue
 
-            try:
-                with open(fpath, "r", encoding="utf-8") as f:
-                    lines = f.readlines()
-            except Exception:
+            # Skip project-internal imports
+            top_module = module_name.split(".")[0]
+            if top_module in local_modules:
                 continue
 
-            for i, line in enumerate(lines):
-                stripped = line.strip()
-                if not stripped or stripped.startswith("#"):
-                    continue
+            # Stdlib and already-located modules exist without probing
+            if top_module in sys.stdlib_module_names or top_module in _FOUND_MODULES:
+                continue
 
-                # Match "import xyz" or "from xyz import ..."
-                m_import = re.match(r"^import\s+([\w\.]+)", stripped)
-                m_from = re.match(r"^from\s+([\w\.]+)\s+import", stripped)
+            # Try to find the module in the Python environment
+            exists = spec_cache.get(top_module)
+            if exists is None:
+                try:
+                    exists = importlib.util.find_spec(top_module) is not None
+                except (ModuleNotFoundError, ValueError):
+                    exists = False
+                spec_cache[top_module] = exists
+                if exists:
+                    _FOUND_MODULES.add(top_module)
+            if exists:
+                continue  # Module exists, skip
+
+            # Module doesn't exist — generate removal fix
+            _log("IMPORT", f"Non-existent module '{module_name}' in {rel_path}:{i+1}")
+            fixes.append({
+                "file": rel_path,
+                "line": i + 1,
+                "old_code": line.rstrip("\r\n"),
+                "new_code": "",
+                "bug_type": "IMPORT",
+                "description": f"Remove import of non-existent module '{module_name}'",
+            })
 
-                module_name = None
-                if m_import:
-                    module_name = m_import.group(1)
-                elif m_from:
-                    module_name = m_from.group(1)
+    return fixes
 
-                if not module_name:
-                    continue
 
-                # Skip relative imports
-                if module_name.startswith("."):
-                    continue
+# ═══════════════════════════════════════════════════════════════════
+#  3. LINTING ERROR DETECTION & FIX (ast — unused imports)
+# ═══════════════════════════════════════════════════════════════════
 
-                # Skip project-internal imports
-                top_module = module_name.split(".")[0]
-                if top_module in local_modules:
-                    continue
+# Linting/indentation only look at source files — tests have legitimate
+# pytest imports etc. Same globs as flake8's --exclude.
+LINT_EXCLUDE = ("tests", "test_*", "*_test.py", "conftest.py")
 
-                # Try to find the module in the Python environment
-                try:
-                    spec = importlib.util.find_spec(top_module)
-                    if spec is not None:
-                        continue  # Module exists, skip
-                except (ModuleNotFoundError, ValueError):
-                    pass
 
-                # Module doesn't exist — generate removal fix
-                _log("IMPORT", f"Non-existent module '{module_name}' in {rel_path}:{i+1}")
+def _is_lint_target(repo_path: str, rel_path: str) -> bool:
+    """Mirror the flake8 target: src/ if it exists (else the root), minus LINT_EXCLUDE."""
+    parts = rel_path.split("/")
+    if os.path.isdir(os.path.join(repo_path, "src")) and parts[0] != "src":
+        return False
+    return not any(fnmatch.fnmatch(part, pat) for part in parts for pat in LINT_EXCLUDE)
+
+
+def _detect_linting_errors(repo_path: str, parsed: list) -> list:
+    """
+    Turn the unused imports found while parsing (see _parse_all) into
+    fixes removing them — no flake8 subprocess or second parse needed.
+    """
+    fixes = []
+
+    for fpath, rel_path, _, error, unused in parsed:
+        if error is not None or not unused or not _is_lint_target(repo_path, rel_path):
+            continue
+
+        try:
+            with open(fpath, "r", encoding="utf-8") as f:
+                file_lines = f.readlines()
+        except Exception:
+            continue
+
+        for line_no, module_name in unused:
+            # Skip pytest — test files legitimately import it
+            if module_name == "pytest":
+                continue
+
+            if line_no <= len(file_lines):
+                old_code = file_lines[line_no - 1].rstrip("\r\n")
+
+                _log("LINTING", f"Unused import '{module_name}' in {rel_path}:{line_no}")
                 fixes.append({
                     "file": rel_path,
-                    "line": i + 1,
-                    "old_code": line.rstrip("\n").rstrip("\r"),
+                    "line": line_no,
+                    "old_code": old_code,
                     "new_code": "",
-                    "bug_type": "IMPORT",
-                    "description": f"Remove import of non-existent module '{module_name}'",
+                    "bug_type": "LINTING",
+                    "description": f"Remove unused import '{module_name}'",
                 })
 
     return fixes
 
 
 # ═══════════════════════════════════════════════════════════════════
-#  3. LINTING ERROR DETECTION & FIX (flake8 F401 — unused imports)
+#  4. INDENTATION ERROR DETECTION & FIX (flake8 E111, E117)
 # ═══════════════════════════════════════════════════════════════════
 
-def _detect_linting_errors(repo_path: str) -> list:
+INDENT_CODES = ("E111", "E112", "E113", "E114", "E115", "E116", "E117")
+
+
+def _run_flake8(repo_path: str) -> list:
     """
-    Run flake8 with --select=F401 to find unused imports in source files only.
-    Skip test files (they have legitimate pytest imports etc.).
+    Run flake8 for the indentation codes on src/ (or the root if there's
+    no src/), excluding tests.
+
+    Returns:
+        List of (fpath, line_no, code, text) tuples, paths normalized.
     """
-    fixes = []
+    results = []
 
     # Only run flake8 on src/ directory (not tests/) to avoid false positives
     # If no src/ dir, run on root but exclude tests/
@@ -219,8 +536,8 @@ def _detect_linting_errors(repo_path: str) -> list:
         flake8_target = "."
 
     try:
-        cmd = ["flake8", "--select=F401",
-               "--exclude=tests,test_*,*_test.py,conftest.py",
+        cmd = ["flake8", "--select=" + ",".join(INDENT_CODES),
+               "--exclude=" + ",".join(LINT_EXCLUDE),
                "--format=%(path)s:%(row)d:%(col)d:%(code)s:%(text)s",
                flake8_target]
         result = subprocess.run(
@@ -232,7 +549,7 @@ def _detect_linting_errors(repo_path: str) -> list:
         )
         output = result.stdout.strip()
         if not output:
-            return fixes
+            return results
 
         for line in output.split("\n"):
             if not line.strip():
@@ -246,138 +563,63 @@ def _detect_linting_errors(repo_path: str) -> list:
             if fpath.startswith("./"):
                 fpath = fpath[2:]
 
-            line_no = int(parts[1])
-            code = parts[3].strip()
-            text = parts[4].strip()
-
-            if code != "F401":
-                continue
-
-            # Extract module name from flake8 message
-            module_match = re.search(r"'([\w\.]+)'", text)
-            module_name = module_match.group(1) if module_match else "unknown"
-
-            # Skip pytest — test files legitimately import it
-            if module_name == "pytest":
-                continue
-
-            # Read the actual line
-            abs_path = os.path.join(repo_path, fpath)
-            try:
-                with open(abs_path, "r", encoding="utf-8") as f:
-                    file_lines = f.readlines()
-                if line_no <= len(file_lines):
-                    old_code = file_lines[line_no - 1].rstrip("\n").rstrip("\r")
-
-                    _log("LINTING", f"Unused import '{module_name}' in {fpath}:{line_no}")
-                    fixes.append({
-                        "file": fpath,
-                        "line": line_no,
-                        "old_code": old_code,
-                        "new_code": "",
-                        "bug_type": "LINTING",
-                        "description": f"Remove unused import '{module_name}'",
-                    })
-            except Exception:
-                continue
+            results.append((fpath, int(parts[1]), parts[3].strip(), parts[4].strip()))
 
     except FileNotFoundError:
-        _log("WARN", "flake8 not installed — skipping linting checks")
+        _log("WARN", "flake8 not installed — skipping indentation checks")
     except subprocess.TimeoutExpired:
         _log("WARN", "flake8 timed out")
     except Exception as e:
         _log("WARN", f"flake8 error: {e}")
 
-    return fixes
+    return results
 
 
-# ═══════════════════════════════════════════════════════════════════
-#  4. INDENTATION ERROR DETECTION & FIX (flake8 E111, E117)
-# ═══════════════════════════════════════════════════════════════════
-
 def _detect_indentation_errors(repo_path: str) -> list:
     """
-    Run flake8 with --select=E111,E117 to find indentation errors.
+    Run flake8 with --select=E111-E117 to find indentation errors.
     Auto-fix to PEP8 standard (4-space indentation).
     """
     fixes = []
-    try:
-        # Only check src/ for indentation, exclude tests
-        src_dir = os.path.join(repo_path, "src")
-        flake8_target = "src" if os.path.isdir(src_dir) else "."
 
-        result = subprocess.run(
-            ["flake8", "--select=E111,E117,E112,E113,E114,E115,E116",
-             "--exclude=tests,test_*,*_test.py,conftest.py",
-             "--format=%(path)s:%(row)d:%(col)d:%(code)s:%(text)s", flake8_target],
-            cwd=repo_path,
-            capture_output=True,
-            text=True,
-            timeout=30,
-        )
-        output = result.stdout.strip()
-        if not output:
-            return fixes
+    # Group errors by file to fix them together
+    file_errors = {}
+    for fpath, line_no, code, text in _run_flake8(repo_path):
+        if fpath not in file_errors:
+            file_errors[fpath] = []
+        file_errors[fpath].append((line_no, code, text))
+
+    for fpath, errors in file_errors.items():
+        abs_path = os.path.join(repo_path, fpath)
+        try:
+            with open(abs_path, "r", encoding="utf-8") as f:
+                file_lines = f.readlines()
+        except Exception:
+            continue
 
-        # Group errors by file to fix them together
-        file_errors = {}
-        for line in output.split("\n"):
-            if not line.strip():
-                continue
-            parts = line.split(":", 4)
-            if len(parts) < 5:
+        for line_no, code, text in errors:
+            if line_no > len(file_lines):
                 continue
 
-            fpath = parts[0].replace("\\", "/")
-            # Normalize path: strip leading "./"
-            if fpath.startswith("./"):
-                fpath = fpath[2:]
-            line_no = int(parts[1])
-            code = parts[3].strip()
-            text = parts[4].strip()
-
-            if fpath not in file_errors:
-                file_errors[fpath] = []
-            file_errors[fpath].append((line_no, code, text))
-
-        for fpath, errors in file_errors.items():
-            abs_path = os.path.join(repo_path, fpath)
-            try:
-                with open(abs_path, "r", encoding="utf-8") as f:
-                    file_lines = f.readlines()
-            except Exception:
-                continue
+            old_line = file_lines[line_no - 1]
+            old_code = old_line.rstrip("\r\n")
+            content = old_line.lstrip()
 
-            for line_no, code, text in errors:
-                if line_no > len(file_lines):
-                    continue
-
-                old_line = file_lines[line_no - 1]
-                old_code = old_line.rstrip("\n").rstrip("\r")
-                content = old_line.lstrip()
-
-                # Determine the correct indentation level
-                # We need to figure out the nesting depth from context
-                correct_indent = _determine_correct_indent(file_lines, line_no - 1)
-                new_code = correct_indent + content.rstrip("\n").rstrip("\r")
-
-                if old_code != new_code:
-                    _log("INDENTATION", f"Fixing indent in {fpath}:{line_no} ({code})")
-                    fixes.append({
-                        "file": fpath,
-                        "line": line_no,
-                        "old_code": old_code,
-                        "new_code": new_code,
-                        "bug_type": "INDENTATION",
-                        "description": f"Fix indentation to PEP8 standard (4-space)",
-                    })
+            # Determine the correct indentation level
+            # We need to figure out the nesting depth from context
+            correct_indent = _determine_correct_indent(file_lines, line_no - 1)
+            new_code = correct_indent + content.rstrip("\r\n")
 
-    except FileNotFoundError:
-        _log("WARN", "flake8 not installed — skipping indentation checks")
-    except subprocess.TimeoutExpired:
-        _log("WARN", "flake8 timed out")
-    except Exception as e:
-        _log("WARN", f"flake8 error: {e}")
+            if old_code != new_code:
+                _log("INDENTATION", f"Fixing indent in {fpath}:{line_no} ({code})")
+                fixes.append({
+                    "file": fpath,
+                    "line": line_no,
+                    "old_code": old_code,
+                    "new_code": new_code,
+                    "bug_type": "INDENTATION",
+                    "description": f"Fix indentation to PEP8 standard (4-space)",
+                })
 
     return fixes
 
@@ -447,6 +689,79 @@ def _deduplicate_fixes(fixes: list) -> list:
     return unique
 
 
+# ═══════════════════════════════════════════════════════════════════
+#  6. RUN CACHE (whole result keyed by tree hash)
+# ═══════════════════════════════════════════════════════════════════
+
+# flake8 reads its settings from these files in the directory it runs in
+FLAKE8_CONFIG_FILES = ("setup.cfg", "tox.ini", ".flake8")
+
+
+def _tree_hash(repo_path: str, py_files: list) -> str:
+    """
+    Hash the sorted (rel_path, sha256(content)) manifest of all .py files.
+    Everything else that changes what the detectors report for the same
+    sources is folded in too: the Python version, the parse cache format,
+    flake8 availability, the flake8 config files and whether src/ exists
+    (which sets the lint target).
+    """
+    tree = hashlib.sha256()
+    has_src = os.path.isdir(os.path.join(repo_path, "src"))
+    tree.update(
+        f"{sys.version_info[:2]}|v{PARSE_CACHE_VERSION}|flake8={shutil.which('flake8') is not None}"
+        f"|src={has_src}\n".encode()
+    )
+    for name in FLAKE8_CONFIG_FILES:
+        try:
+            with open(os.path.join(repo_path, name), "rb") as f:
+                tree.update(f"{name}\0{hashlib.sha256(f.read()).hexdigest()}\n".encode())
+        except OSError:
+            tree.update(f"{name}\0-\n".encode())
+    for fpath, rel_path, _ in sorted(py_files, key=lambda f: f[1]):
+        file_hash = hashlib.sha256()
+        with open(fpath, "rb") as f:
+            for block in iter(lambda: f.read(65536), b""):
+                file_hash.update(block)
+        tree.update(f"{rel_path}\0{file_hash.hexdigest()}\n".encode())
+    return tree.hexdigest()
+
+
+def _load_cached_run(tree_hash: str):
+    """Return the cached result for this tree, or None on a miss."""
+    try:
+        with open(os.path.join(RUNS_CACHE_DIR, f"{tree_hash}.json"), "r", encoding="utf-8") as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    # Import fixes depend on what's installed, which can change between
+    # runs (run_tests pip-installs requirements) — drop the stale ones
+    fixes = []
+    for fix in result["fixes"]:
+        if fix["bug_type"] == "IMPORT":
+            m = _IMPORT_ANY.match(fix["old_code"].strip())
+            if m:
+                module_name = m.group("imp") or m.group("frm")
+                try:
+                    if importlib.util.find_spec(module_name.split(".")[0]) is not None:
+                        continue
+                except (ModuleNotFoundError, ValueError):
+                    pass
+        fixes.append(fix)
+    result["fixes"] = fixes
+    return result
+
+
+def _save_cached_run(tree_hash: str, result: dict):
+    """Persist the result for this tree."""
+    try:
+        os.makedirs(RUNS_CACHE_DIR, exist_ok=True)
+        with open(os.path.join(RUNS_CACHE_DIR, f"{tree_hash}.json"), "w", encoding="utf-8") as f:
+            json.dump(result, f)
+    except OSError as e:
+        _log("WARN", f"Could not save run cache: {e}")
+
+
 # ═══════════════════════════════════════════════════════════════════
 #  PUBLIC API
 # ═══════════════════════════════════════════════════════════════════
@@ -454,7 +769,11 @@ def _deduplicate_fixes(fixes: list) -> list:
 def detect_and_fix_deterministic(repo_path: str) -> dict:
     """
     Run all deterministic bug detectors on the repo.
-    Returns fixes in the same format as llm.ask_for_fixes().
+    Returns fixes in the same format as llm.ask_for_fixes(), plus
+    "phases_skipped": True when syntax errors were found and the
+    linting/indentation phases were skipped — apply the fixes and call
+    again to run them — and "cached": True when the result was reused
+    from a previous run over identical sources.
 
     This should be called BEFORE the LLM — any bugs fixed here
     don't need to be sent to the LLM at all.
@@ -463,29 +782,52 @@ def detect_and_fix_deterministic(repo_path: str) -> dict:
 
     all_fixes = []
 
+    # Walk the tree once; every detector below reuses this list
+    py_files = list(_iter_py_files(repo_path))
+
+    # The whole pass is deterministic in the file contents — reuse the
+    # previous result if no .py file (or flake8 config) changed
+    tree_hash = _tree_hash(repo_path, py_files)
+    cached = _load_cached_run(tree_hash)
+    if cached is not None:
+        _log("CACHE", f"Tree unchanged ({tree_hash[:12]}) — reusing {len(cached['fixes'])} cached fixes")
+        cached["cached"] = True
+        return cached
+
+    # Parse every file once; syntax and linting phases share the results
+    parse_cache = _load_parse_cache()
+    parsed = _parse_all(py_files, parse_cache)
+    _save_parse_cache(parse_cache)
+
     # 1. Syntax errors (must be fixed first — they block everything else)
     _log("PHASE", "Phase 1: Checking for syntax errors (ast.parse)...")
-    syntax_fixes = _detect_syntax_errors(repo_path)
+    syntax_fixes = _detect_syntax_errors(parsed)
     all_fixes.extend(syntax_fixes)
     _log("PHASE", f"  Found {len(syntax_fixes)} syntax errors")
 
     # 2. Import errors (non-existent modules)
     _log("PHASE", "Phase 2: Checking for import errors (importlib)...")
-    import_fixes = _detect_import_errors(repo_path)
+    import_fixes = _detect_import_errors(repo_path, py_files)
     all_fixes.extend(import_fixes)
     _log("PHASE", f"  Found {len(import_fixes)} import errors")
 
-    # 3. Linting errors (unused imports) — only if no syntax errors block flake8
-    _log("PHASE", "Phase 3: Checking for linting errors (flake8 F401)...")
-    linting_fixes = _detect_linting_errors(repo_path)
-    all_fixes.extend(linting_fixes)
-    _log("PHASE", f"  Found {len(linting_fixes)} linting errors")
-
-    # 4. Indentation errors
-    _log("PHASE", "Phase 4: Checking for indentation errors (flake8 E111/E117)...")
-    indent_fixes = _detect_indentation_errors(repo_path)
-    all_fixes.extend(indent_fixes)
-    _log("PHASE", f"  Found {len(indent_fixes)} indentation errors")
+    # Linting a tree that doesn't parse is wasted work — leave phases 3/4
+    # for the re-run the caller does once the syntax fixes are applied
+    phases_skipped = bool(syntax_fixes)
+    if phases_skipped:
+        _log("PHASE", "Skipping linting/indentation phases — syntax errors present")
+    else:
+        # 3. Linting errors (unused imports) — reported only for files that parsed
+        _log("PHASE", "Phase 3: Checking for linting errors (unused imports, ast)...")
+        linting_fixes = _detect_linting_errors(repo_path, parsed)
+        all_fixes.extend(linting_fixes)
+        _log("PHASE", f"  Found {len(linting_fixes)} linting errors")
+
+        # 4. Indentation errors
+        _log("PHASE", "Phase 4: Checking for indentation errors (flake8 E111/E117)...")
+        indent_fixes = _detect_indentation_errors(repo_path)
+        all_fixes.extend(indent_fixes)
+        _log("PHASE", f"  Found {len(indent_fixes)} indentation errors")
 
     # Deduplicate
     all_fixes = _deduplicate_fixes(all_fixes)
@@ -496,7 +838,12 @@ def detect_and_fix_deterministic(repo_path: str) -> dict:
 
     commit_title = "[AI-AGENT] Fix syntax, import, linting, and indentation errors (deterministic)"
 
-    return {
+    result = {
         "fixes": all_fixes,
         "commit_title": commit_title,
+        "phases_skipped": phases_skipped,
+        "cached": False,
     }
+    _save_cached_run(tree_hash, result)
+    return result
+
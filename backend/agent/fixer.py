@@ -3,87 +3,123 @@ Apply code fixes to files in the repository.
 """
 
 import os
+from collections import defaultdict
+
+
+def _apply_fix_to_lines(lines: list, fix: dict) -> bool:
+    """
+    Apply one line-level fix to an in-memory line list.
+
+    Sets fix["status"]/fix["status_message"] on failure.
+
+    Returns:
+        True if the fix was applied, False otherwise.
+    """
+    line_idx = fix["line"] - 1  # Convert to 0-indexed
+
+    if line_idx < 0 or line_idx >= len(lines):
+        fix["status"] = "failed"
+        fix["status_message"] = f"Line {fix['line']} out of range (file has {len(lines)} lines)"
+        return False
+
+    old_code = fix.get("old_code", "").strip()
+    new_code = fix.get("new_code", "")
+
+    # Verify the line matches what we expect
+    actual_line = lines[line_idx].rstrip("\r\n")
+    if old_code and old_code.strip() != actual_line.strip():
+        # Try to find the line elsewhere in the file
+        found = False
+        for i, line in enumerate(lines):
+            if line.rstrip("\r\n").strip() == old_code.strip():
+                line_idx = i
+                found = True
+                break
+        if not found:
+            fix["status"] = "failed"
+            fix["status_message"] = f"Expected '{old_code}' at line {fix['line']}, found '{actual_line}'"
+            return False
+
+    # Apply the fix
+    if new_code == "" or new_code is None:
+        # Delete the line (remove unused import, etc.)
+        lines.pop(line_idx)
+        print(f"[FIXER] Removed line {fix['line']} from {fix['file']}")
+    else:
+        # Preserve original indentation/newline
+        original_newline = "\n"
+        if lines[line_idx].endswith("\r\n"):
+            original_newline = "\r\n"
+
+        lines[line_idx] = new_code + original_newline
+        print(f"[FIXER] Replaced line {fix['line']} in {fix['file']}")
+
+    return True
 
 
 def apply_fixes(repo_path: str, fixes: list) -> list:
     """
     Apply line-level code fixes to files.
-    
+
+    Fixes are grouped by file so each file is read and written once.
+    Within a file they are applied bottom-up (line number descending),
+    so deleting a line never shifts the line numbers of fixes still to
+    be applied.
+
     Args:
         repo_path: Path to the cloned repository.
         fixes: List of fix dicts from llm.ask_for_fixes().
-    
+
     Returns:
-        List of fix dicts with added 'status' field ('applied' or 'failed').
+        List of fix dicts with added 'status' field ('applied' or 'failed'),
+        in the same order as `fixes`.
     """
-    results = []
-
+    by_file = defaultdict(list)
     for fix in fixes:
-        file_path = os.path.join(repo_path, fix["file"])
-        try:
-            if not os.path.exists(file_path):
+        by_file[fix.get("file", "")].append(fix)
+
+    for rel_file, file_fixes in by_file.items():
+        file_path = os.path.join(repo_path, rel_file)
+        if not os.path.isfile(file_path):
+            for fix in file_fixes:
                 fix["status"] = "failed"
-                fix["status_message"] = f"File not found: {fix['file']}"
-                results.append(fix)
-                continue
+                fix["status_message"] = f"File not found: {rel_file}"
+            continue
 
+        try:
             with open(file_path, "r", encoding="utf-8") as f:
                 lines = f.readlines()
 
-            line_idx = fix["line"] - 1  # Convert to 0-indexed
-
-            if line_idx < 0 or line_idx >= len(lines):
-                fix["status"] = "failed"
-                fix["status_message"] = f"Line {fix['line']} out of range (file has {len(lines)} lines)"
-                results.append(fix)
-                continue
-
-            old_code = fix.get("old_code", "").strip()
-            new_code = fix.get("new_code", "")
-
-            # Verify the line matches what we expect
-            actual_line = lines[line_idx].rstrip("\n").rstrip("\r")
-            if old_code and old_code.strip() != actual_line.strip():
-                # Try to find the line elsewhere in the file
-                found = False
-                for i, line in enumerate(lines):
-                    if line.rstrip("\n").rstrip("\r").strip() == old_code.strip():
-                        line_idx = i
-                        found = True
-                        break
-                if not found:
+            applied = []
+            ordered = sorted(
+                file_fixes,
+                key=lambda fx: fx["line"] if isinstance(fx.get("line"), int) else 0,
+                reverse=True,
+            )
+            for fix in ordered:
+                try:
+                    if _apply_fix_to_lines(lines, fix):
+                        applied.append(fix)
+                except Exception as e:
                     fix["status"] = "failed"
-                    fix["status_message"] = f"Expected '{old_code}' at line {fix['line']}, found '{actual_line}'"
-                    results.append(fix)
-                    continue
-
-            # Apply the fix
-            if new_code == "" or new_code is None:
-                # Delete the line (remove unused import, etc.)
-                lines.pop(line_idx)
-                print(f"[FIXER] Removed line {fix['line']} from {fix['file']}")
-            else:
-                # Preserve original indentation/newline
-                original_newline = "\n"
-                if lines[line_idx].endswith("\r\n"):
-                    original_newline = "\r\n"
-
-                lines[line_idx] = new_code + original_newline
-                print(f"[FIXER] Replaced line {fix['line']} in {fix['file']}")
-
-            # Write back
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.writelines(lines)
-
-            fix["status"] = "applied"
-            fix["status_message"] = "Fix applied successfully"
-            results.append(fix)
+                    fix["status_message"] = str(e)
+
+            # Write back once for all of this file's fixes
+            if applied:
+                with open(file_path, "w", encoding="utf-8") as f:
+                    f.writelines(lines)
+
+            for fix in applied:
+                fix["status"] = "applied"
+                fix["status_message"] = "Fix applied successfully"
 
         except Exception as e:
-            fix["status"] = "failed"
-            fix["status_message"] = str(e)
-            results.append(fix)
+            for fix in file_fixes:
+                if fix.get("status") != "failed":
+                    fix["status"] = "failed"
+                    fix["status_message"] = str(e)
 
+    results = list(fixes)
     applied_count = sum(1 for r in results if r["status"] == "applied")
     print(f"[FIXER] Applied {applied_count}/{len(fixes)} fixes")
 
@@ -13,8 +13,26 @@ Supports four modes:
 
 import os
 import json
-import re
+import time
+import queue
+import atexit
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# orjson is an optional, faster drop-in for the json module
+try:
+    import orjson
+
+    _loads = orjson.loads
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode("utf-8")
+except ImportError:
+    _loads = json.loads
+
+    def _dumps(obj) -> str:
+        return json.dumps(obj, indent=2)
 
 # Load .env file if python-dotenv is available
 try:
@@ -38,6 +56,7 @@ OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1/chat/completions"
 # Cerebras settings
 CEREBRAS_API_KEY = os.environ.get("CEREBRAS_API_KEY", "")
 CEREBRAS_MODEL = os.environ.get("CEREBRAS_MODEL", "qwen-3-235b-a22b-instruct-2507")
+_cerebras_client = None  # created on first use, then reused
 
 # Gemini settings — round-robin key rotation for rate-limit resilience
 GEMINI_API_KEYS = [
@@ -55,27 +74,51 @@ if not GEMINI_API_KEYS:
 _gemini_key_index = 0  # rotates on each call
 GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-3-flash-preview")
 
+# Files with a reported error line are sent as ±this many lines around
+# each error instead of in full
+ERROR_WINDOW_LINES = 30
+
+# Race every provider that has a key and take the first usable reply
+LLM_RACE = os.environ.get("LLM_RACE", "false").lower() == "true"
+
+# Print full prompts/responses to the console (they're always saved to logs/)
+LLM_VERBOSE = os.environ.get("LLM_VERBOSE", "false").lower() == "true"
+
+# One keep-alive HTTP session for OpenRouter/Gemini — later calls and
+# 429 retries reuse the open TLS connection
+_session = requests.Session()
+_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=0))
+_session.headers.update({"Content-Type": "application/json"})
+
 # Logs directory
 LOGS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
-os.makedirs(LOGS_DIR, exist_ok=True)
 
 
 # ═══════════════════════════════════════════════════════════════════
 #  LOGGING HELPERS
 # ═══════════════════════════════════════════════════════════════════
 
-def _save_to_log(label: str, prompt: str, response: str):
-    """Save a prompt+response pair to a timestamped log file."""
-    import time
-    timestamp = time.strftime("%Y-%m-%d_%H-%M-%S")
-    filename = f"{timestamp}_{label}.txt"
+_log_queue = queue.Queue()
+_logs_dir_ready = False
+
+
+def _ensure_logs_dir():
+    global _logs_dir_ready
+    if not _logs_dir_ready:
+        os.makedirs(LOGS_DIR, exist_ok=True)
+        _logs_dir_ready = True
+
+
+def _write_log_file(filename: str, label: str, timestamp: str, mode: str, prompt: str, response: str):
+    """Write one prompt+response pair to logs/<filename>."""
+    _ensure_logs_dir()
     filepath = os.path.join(LOGS_DIR, filename)
 
     with open(filepath, "w", encoding="utf-8") as f:
         f.write("=" * 80 + "\n")
         f.write(f"  LABEL: {label}\n")
         f.write(f"  TIME:  {timestamp}\n")
-        f.write(f"  MODE:  {'DUMMY' if USE_DUMMY_LLM else LLM_PROVIDER.upper()}\n")
+        f.write(f"  MODE:  {mode}\n")
         f.write("=" * 80 + "\n\n")
         f.write(">>> PROMPT SENT TO LLM:\n")
         f.write("-" * 80 + "\n")
@@ -86,6 +129,35 @@ def _save_to_log(label: str, prompt: str, response: str):
         f.write(response + "\n")
         f.write("-" * 80 + "\n")
 
+
+def _log_worker():
+    """Background thread: write queued log entries to disk."""
+    while True:
+        item = _log_queue.get()
+        try:
+            _write_log_file(*item)
+        except Exception as e:
+            _log("ERROR", f"Could not write log file {item[0]}: {e}")
+        finally:
+            _log_queue.task_done()
+
+
+def _drain_log_queue():
+    """Flush pending log writes before the interpreter exits."""
+    _log_queue.join()
+
+
+threading.Thread(target=_log_worker, name="llm-log-writer", daemon=True).start()
+atexit.register(_drain_log_queue)
+
+
+def _save_to_log(label: str, prompt: str, response: str):
+    """Queue a prompt+response pair for a timestamped log file (written in the background)."""
+    timestamp = time.strftime("%Y-%m-%d_%H-%M-%S")
+    filename = f"{timestamp}_{label}.txt"
+    mode = "DUMMY" if USE_DUMMY_LLM else LLM_PROVIDER.upper()
+    _log_queue.put((filename, label, timestamp, mode, prompt, response))
+
     _log("SAVE", f"Prompt+response saved to: logs/{filename}")
 
 
@@ -94,6 +166,8 @@ def _log(tag, message):
 
 
 def _log_block(tag, title, content):
+    if not LLM_VERBOSE:
+        return
     separator = "─" * 70
     print(f"\n[LLM] [{tag}] ┌{separator}")
     print(f"[LLM] [{tag}] │ {title}")
@@ -103,6 +177,47 @@ def _log_block(tag, title, content):
     print(f"[LLM] [{tag}] └{separator}\n")
 
 
+class _JsonObjectScanner:
+    """
+    Incrementally track brace depth over streamed text to spot the end of
+    the first top-level JSON object. Braces inside JSON strings are ignored.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.start = -1  # offset of the opening '{'
+        self.end = -1    # offset just past the matching '}'
+        self._pos = 0
+
+    def feed(self, chunk: str) -> bool:
+        """Consume the next chunk; returns True once the object is closed."""
+        for i, ch in enumerate(chunk):
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                if self.depth:
+                    self.in_string = True
+            elif ch == "{":
+                if self.depth == 0:
+                    self.start = self._pos + i
+                self.depth += 1
+            elif ch == "}" and self.depth:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.end = self._pos + i + 1
+                    self._pos += len(chunk)
+                    return True
+        self._pos += len(chunk)
+        return False
+
+
 SYSTEM_PROMPT = (
     "You are a code-fixing AI. Analyze test errors and source code, "
     "return precise fixes in the exact JSON format requested. "
@@ -114,8 +229,61 @@ SYSTEM_PROMPT = (
 #  LLM CALL DISPATCHER
 # ═══════════════════════════════════════════════════════════════════
 
+def _configured_providers() -> dict:
+    """Providers that have credentials set, mapped to their call functions."""
+    providers = {}
+    if CEREBRAS_API_KEY:
+        providers["cerebras"] = _call_cerebras
+    if GEMINI_API_KEYS:
+        providers["gemini"] = _call_gemini
+    if OPENROUTER_API_KEY and OPENROUTER_API_KEY != "sk-REPLACE-ME":
+        providers["openrouter"] = _call_openrouter
+    return providers
+
+
+def _is_usable_reply(reply: str) -> bool:
+    """True if the reply contains a JSON object that actually parses."""
+    return _find_json_object(reply) is not None
+
+
+def _race_providers(prompt: str, providers: dict) -> str:
+    """
+    Send the prompt to every provider at once and return the first reply
+    that parses. Slower calls can't be interrupted mid-request, so they're
+    abandoned to finish in the background.
+    """
+    _log("PROVIDER", f"Racing LLM providers: {', '.join(p.upper() for p in providers)}")
+    executor = ThreadPoolExecutor(max_workers=len(providers), thread_name_prefix="llm-race")
+    futures = {executor.submit(call, prompt): name for name, call in providers.items()}
+    errors = []
+    try:
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                reply = future.result()
+            except Exception as e:
+                errors.append(f"{name}: {e}")
+                _log("WARN", f"{name.upper()} failed in race: {e}")
+                continue
+            if _is_usable_reply(reply):
+                _log("PROVIDER", f"{name.upper()} answered first")
+                return reply
+            errors.append(f"{name}: reply was not valid JSON")
+            _log("WARN", f"{name.upper()} returned an unparseable reply")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    raise RuntimeError(f"All raced LLM providers failed: {'; '.join(errors)}")
+
+
 def _call_llm(prompt: str) -> str:
     """Route the prompt to the configured LLM provider."""
+    if LLM_RACE:
+        providers = _configured_providers()
+        if len(providers) > 1:
+            _log_block("SEND", f"PROMPT BEING SENT TO LLM ({'/'.join(p.upper() for p in providers)})", prompt)
+            return _race_providers(prompt, providers)
+
     _log("PROVIDER", f"Using LLM provider: {LLM_PROVIDER.upper()}")
     _log_block("SEND", f"PROMPT BEING SENT TO LLM ({LLM_PROVIDER.upper()})", prompt)
 
@@ -133,11 +301,15 @@ def _call_llm(prompt: str) -> str:
 
 def _call_cerebras(prompt: str) -> str:
     """Send a prompt to Cerebras Cloud SDK and return the streamed response."""
-    from cerebras.cloud.sdk import Cerebras
+    global _cerebras_client
 
     _log("API", f"Calling Cerebras model: {CEREBRAS_MODEL}")
 
-    client = Cerebras(api_key=CEREBRAS_API_KEY)
+    # Keep one client so its HTTP connection pool stays warm between calls
+    if _cerebras_client is None:
+        from cerebras.cloud.sdk import Cerebras
+        _cerebras_client = Cerebras(api_key=CEREBRAS_API_KEY)
+    client = _cerebras_client
 
     retries = 3
     backoff = 2
@@ -156,14 +328,34 @@ def _call_cerebras(prompt: str) -> str:
                 top_p=0.8,
             )
 
-            # Collect streamed chunks
+            # Collect streamed chunks — stop as soon as the JSON object closes.
+            # If the first balanced {...} doesn't parse (braces in prose),
+            # read the rest and leave it to _extract_json
             reply_parts = []
+            scanner = _JsonObjectScanner()
+            closed = False
+            watching = True
             for chunk in stream:
                 delta = chunk.choices[0].delta.content
                 if delta:
                     reply_parts.append(delta)
+                    if watching and scanner.feed(delta):
+                        candidate = "".join(reply_parts)[scanner.start:scanner.end]
+                        try:
+                            _loads(candidate)
+                        except ValueError:
+                            watching = False
+                            continue
+                        closed = True
+                        break
 
             reply = "".join(reply_parts)
+            if closed:
+                # Anything after the object (e.g. a closing ``` fence) is dropped
+                reply = reply[scanner.start:scanner.end]
+                close = getattr(stream, "close", None)
+                if close:
+                    close()
             _log_block("RECV", "RESPONSE FROM CEREBRAS", reply)
             return reply
 
@@ -173,7 +365,6 @@ def _call_cerebras(prompt: str) -> str:
                 if attempt < retries - 1:
                     sleep_time = backoff * (2 ** attempt)
                     _log("WARN", f"Cerebras rate limited. Retrying in {sleep_time}s...")
-                    import time
                     time.sleep(sleep_time)
                     continue
             _log("ERROR", f"Cerebras API call failed: {e}")
@@ -192,7 +383,6 @@ def _call_gemini(prompt: str) -> str:
     automatically switches to the next key and retries.
     """
     global _gemini_key_index
-    import time
 
     if not GEMINI_API_KEYS:
         raise RuntimeError("No Gemini API keys configured. Set GEMINI_API_KEY_1/2/3 in .env")
@@ -230,9 +420,8 @@ def _call_gemini(prompt: str) -> str:
         for attempt in range(retries):
             try:
                 _log("API", f"Attempt {attempt+1}/{retries} with {key_label}")
-                response = requests.post(
+                response = _session.post(
                     url,
-                    headers={"Content-Type": "application/json"},
                     json=payload,
                     timeout=120,
                 )
@@ -294,7 +483,6 @@ def _call_openrouter(prompt: str) -> str:
     """Send a prompt to OpenRouter and return the response."""
     headers = {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json",
         "HTTP-Referer": "https://github.com/ci-cd-agent",
         "X-Title": "CI/CD Healing Agent",
     }
@@ -316,7 +504,7 @@ def _call_openrouter(prompt: str) -> str:
 
     for attempt in range(retries):
         try:
-            response = requests.post(
+            response = _session.post(
                 OPENROUTER_BASE_URL,
                 headers=headers,
                 json=payload,
@@ -327,7 +515,6 @@ def _call_openrouter(prompt: str) -> str:
                 if attempt < retries - 1:
                     sleep_time = backoff * (2 ** attempt)
                     _log("WARN", f"Rate limited (429). Retrying in {sleep_time}s...")
-                    import time
                     time.sleep(sleep_time)
                     continue
                 else:
@@ -346,25 +533,79 @@ def _call_openrouter(prompt: str) -> str:
             raise RuntimeError(f"LLM API call failed: {e}")
 
 
+# Opening of a fenced JSON block, as LLMs usually wrap their answer
+_JSON_FENCE = "```json"
+
+
+def _fenced_json(text: str):
+    """The body of the first ```json fence in text, or None (plain str.find, no regex)."""
+    start = text.find(_JSON_FENCE)
+    if start == -1:
+        return None
+    start += len(_JSON_FENCE)
+    end = text.find("```", start)
+    return text[start:] if end == -1 else text[start:end]
+
+
+def _parse_json_object(text: str):
+    """
+    Find and parse the JSON object in an LLM reply. A ```json fence is
+    searched first; then the whole text. Within each, {...} candidates
+    are tried in order — when one doesn't parse or never closes (a `{foo}`
+    or stray '{' in prose), the scan resumes at the next '{'.
+
+    Returns:
+        (json_str, parsed), or (None, None) if no candidate parses.
+    """
+    fenced = _fenced_json(text)
+    for region in (fenced, text) if fenced is not None else (text,):
+        pos = 0
+        while True:
+            scanner = _JsonObjectScanner()
+            if not scanner.feed(region[pos:] if pos else region):
+                if scanner.start == -1:
+                    break
+                # Unbalanced: a stray '{' swallowed the real object
+                pos += scanner.start + 1
+                continue
+            candidate = region[pos + scanner.start:pos + scanner.end]
+            try:
+                parsed = _loads(candidate)
+            except ValueError:
+                pos += scanner.start + 1
+                continue
+            if isinstance(parsed, dict):
+                return candidate, parsed
+            pos += scanner.start + 1
+    return None, None
+
+
+def _find_json_object(text: str):
+    """Return the JSON object text in an LLM reply, or None (see _parse_json_object)."""
+    return _parse_json_object(text)[0]
+
+
 def _extract_json(text: str) -> dict:
     """Extract and parse JSON from LLM response text."""
     _log("PARSE", "Extracting JSON from response...")
 
-    # Try code blocks first
-    code_block = re.search(r"```(?:json)?\s*\n?(.*?)\n?```", text, re.DOTALL)
-    if code_block:
-        json_str = code_block.group(1).strip()
-    else:
-        json_str = text.strip()
-
-    try:
-        parsed = json.loads(json_str)
+    json_str, parsed = _parse_json_object(text)
+    if json_str is not None:
         _log("PARSE", f"Successfully parsed JSON with keys: {list(parsed.keys())}")
         return parsed
-    except json.JSONDecodeError as e:
+
+    # No object parsed — report the error for the reply as a whole
+    json_str = text.strip()
+    try:
+        parsed = _loads(json_str)
+    except ValueError as e:
         _log("ERROR", f"Failed to parse JSON: {e}")
         _log("ERROR", f"Raw text was: {json_str[:500]}")
         raise RuntimeError(f"Failed to parse LLM response as JSON: {e}")
+    if not isinstance(parsed, dict):
+        raise RuntimeError("Failed to parse LLM response as JSON: not an object")
+    _log("PARSE", f"Successfully parsed JSON with keys: {list(parsed.keys())}")
+    return parsed
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -407,6 +648,45 @@ def _dummy_ask_for_fixes() -> dict:
     return result
 
 
+# ═══════════════════════════════════════════════════════════════════
+#  PROMPT HELPERS
+# ═══════════════════════════════════════════════════════════════════
+
+def _windowed_files_text(file_contents: dict, errors: list, radius: int) -> str:
+    """
+    Render each file as numbered windows of ±radius lines around the error
+    lines reported in it; overlapping windows are merged. Files with no
+    line-numbered error are included whole.
+    """
+    error_lines = {}
+    for e in errors:
+        line = e.get("line")
+        if isinstance(line, int) and line > 0:
+            error_lines.setdefault(e.get("file", ""), set()).add(line)
+
+    parts = []
+    for filepath, content in file_contents.items():
+        lines = content.split("\n")
+        targets = [n for n in error_lines.get(filepath, ()) if n <= len(lines)]
+        if not targets:
+            parts.append(f"\n--- FILE: {filepath} ---\n{content}\n")
+            continue
+
+        windows = []
+        for line in sorted(targets):
+            start, end = max(1, line - radius), min(len(lines), line + radius)
+            if windows and start <= windows[-1][1] + 1:
+                windows[-1][1] = max(windows[-1][1], end)
+            else:
+                windows.append([start, end])
+
+        for start, end in windows:
+            numbered = "\n".join(f"{n:>5} | {lines[n - 1]}" for n in range(start, end + 1))
+            parts.append(f"\n--- FILE: {filepath} (lines {start}-{end}) ---\n{numbered}\n")
+
+    return "".join(parts)
+
+
 # ═══════════════════════════════════════════════════════════════════
 #  PUBLIC API — called by pipeline.py
 # ═══════════════════════════════════════════════════════════════════
@@ -429,9 +709,13 @@ def ask_for_fixes(tree_str: str, file_contents: dict, errors: list) -> dict:
     # ── Dummy mode ──
     if USE_DUMMY_LLM:
         dummy_result = _dummy_ask_for_fixes()
-        _save_to_log("ask_for_fixes", "(DUMMY MODE — no prompt sent)", json.dumps(dummy_result, indent=2))
+        _save_to_log("ask_for_fixes", "(DUMMY MODE — no prompt sent)", _dumps(dummy_result))
         return dummy_result
 
+    if not errors:
+        _log("STEP", "No errors to fix — skipping LLM call")
+        return {"fixes": [], "commit_title": "[AI-AGENT] No errors to fix"}
+
     # ── Real LLM mode ──
     errors_text = "\n".join(
         f"  - Test: {e.get('test_name', 'unknown')} | File: {e.get('file', '?')} | "
@@ -439,9 +723,7 @@ def ask_for_fixes(tree_str: str, file_contents: dict, errors: list) -> dict:
         for e in errors
     )
 
-    files_text = ""
-    for filepath, content in file_contents.items():
-        files_text += f"\n--- FILE: {filepath} ---\n{content}\n"
+    files_text = _windowed_files_text(file_contents, errors, ERROR_WINDOW_LINES)
 
     prompt = f"""You are a code-fixing AI. Here are the test errors:
 
@@ -472,6 +754,7 @@ IMPORTANT:
 - "old_code" must match the EXACT current line (whitespace matters).
 - "new_code" is the replacement. Use "" to delete a line.
 - Include ALL fixes needed.
+- Lines shown as "  NNN | code" are numbered for reference; "NNN | " is NOT part of the code.
 """
 
     response_text = _call_llm(prompt)
@@ -12,18 +12,44 @@ structured SSE events to the frontend for real-time progressive rendering.
 import os
 import json
 import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from agent.clone import clone_repo
-from agent.analyzer import analyze_repo
+from agent.analyzer import analyze_repo, walk_files
 from agent.test_runner import run_tests
 from agent.deterministic_fixer import detect_and_fix_deterministic
+from agent import llm
 from agent.llm import ask_for_fixes
 from agent.fixer import apply_fixes
-from agent.git_ops import make_branch_name, create_branch, commit_and_push
+from agent.git_ops import make_branch_name, create_branch, commit_and_push, head_commit
 
 # Default workspace for cloned repos
 WORKSPACE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "workspace")
 MAX_ITERATIONS = 5
+# Deterministic re-runs after syntax fixes (each pass can unblock linting)
+MAX_DETERMINISTIC_PASSES = 3
+# LLM replies are cached by (provider/model, tree, file contents, errors) for this
+# many seconds — LLM_CACHE_TTL=0 disables the cache
+LLM_CACHE_DIR = os.path.join(WORKSPACE_DIR, ".llmcache")
+LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", "86400"))
+# SSE events are sent in batches: flushed after this many seconds or once
+# this many are queued, whichever comes first
+EMIT_BATCH_INTERVAL = 0.1
+EMIT_BATCH_SIZE = 20
+# Thread pool size for read_file_contents
+READ_WORKERS = 8
+# Source files without an error line in them are cut to this many chars
+# before going into the LLM prompt
+MAX_FILE_CHARS = 200_000
+TRUNCATED_MARKER = "# ... truncated ...\n"
+# analyze_repo results keyed by (repo URL, HEAD commit) — a fresh clone of
+# the same commit always analyzes the same
+ANALYSIS_CACHE_DIR = os.path.join(WORKSPACE_DIR, ".analysis")
+# Full per-iteration records (errors, fix details, commits) are streamed
+# here as JSONL; result["iterations"] keeps only a summary of each
+RUNS_DIR = os.path.join(WORKSPACE_DIR, ".runs")
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -50,6 +76,13 @@ def _info(tag, message):
     print(f"[PIPELINE] [{tag}] {message}")
 
 
+def _info_lines(tag, messages):
+    """Print several tagged info lines with a single write."""
+    text = "\n".join(f"[PIPELINE] [{tag}] {m}" for m in messages)
+    if text:
+        print(text)
+
+
 def _print_block(title, content, max_lines=100):
     """Print a multiline block with box drawing."""
     lines = content.split("\n")
@@ -64,14 +97,78 @@ def _print_block(title, content, max_lines=100):
     print(f"[PIPELINE] └{'─' * 50}\n")
 
 
+# ═══════════════════════════════════════════════════════════════════
+#  ERROR CLASSIFICATION — decides whether an error needs the LLM
+# ═══════════════════════════════════════════════════════════════════
+
+# Checked in order against error_message; IndentationError is a
+# SyntaxError subclass, and collection errors quote the underlying
+# SyntaxError after "ImportError while importing", so order matters
+_ERROR_SIGNATURES = (
+    (("IndentationError", "TabError"), "INDENTATION"),
+    (("SyntaxError",), "SYNTAX"),
+    (("ModuleNotFoundError", "ImportError"), "IMPORT"),
+    (("imported but unused", "F401"), "LINTING"),
+    (("TypeError", "AttributeError"), "TYPE_ERROR"),
+)
+# Kinds the deterministic fixer handles on its own
+DETERMINISTIC_KINDS = frozenset({"SYNTAX", "IMPORT", "INDENTATION", "LINTING"})
+
+
+def _classify(err: dict) -> str:
+    """
+    Bucket a parsed test error by its message: SYNTAX, IMPORT, INDENTATION,
+    LINTING, TYPE_ERROR, LOGIC (any other failure), or UNKNOWN (no message).
+    """
+    msg = err.get("error_message") or ""
+    for needles, kind in _ERROR_SIGNATURES:
+        if any(n in msg for n in needles):
+            return kind
+    return "LOGIC" if msg.strip() else "UNKNOWN"
+
+
+def _ran_tests(test_results: dict) -> bool:
+    """
+    True if the run actually executed the suite — not stopped at
+    collection or killed by the timeout — so its duration is a fair
+    bound for the next run.
+    """
+    if test_results.get("timed_out"):
+        return False
+    if test_results["passed"] + test_results["failed"] == 0:
+        return False
+    return not any(
+        e.get("test_name", "").startswith("collection_error:") for e in test_results["errors"]
+    )
+
+
 # ═══════════════════════════════════════════════════════════════════
 #  FILE READER — reads source files from test error paths
 # ═══════════════════════════════════════════════════════════════════
 
-def _discover_source_files_from_errors(repo_path: str, errors: list) -> list:
+# Source files exclude tests: test_*.py / *_test.py anywhere, and
+# everything under a tests/ directory
+_TEST_PREFIX = ("test_",)
+_TEST_SUFFIX = ("_test.py",)
+_TEST_DIR = "tests"
+
+
+def _list_source_files(repo_path: str) -> list:
+    """All source .py files (non-test files) in the repo, from the shared walk."""
+    return [
+        rel_path for _, rel_path, name in walk_files(repo_path)
+        if name.endswith(".py") and not name.startswith(_TEST_PREFIX) and not name.endswith(_TEST_SUFFIX)
+        and _TEST_DIR not in rel_path.split("/")[:-1]
+    ]
+
+
+def _discover_source_files_from_errors(repo_path: str, errors: list, source_files: list = None) -> list:
     """
     Extract source file paths from test errors + discover all src/*.py files.
     This REPLACES the old ask_files_needed() LLM call entirely.
+
+    Fixes only edit lines, never add or remove files, so callers can list
+    the source files once and pass them in as source_files.
     """
     files = set()
 
@@ -81,46 +178,271 @@ def _discover_source_files_from_errors(repo_path: str, errors: list) -> list:
         if err_file and not err_file.startswith("test") and not "/test_" in err_file:
             files.add(err_file)
 
-    # 2. Also discover all source .py files (non-test files)
-    for root, dirs, filenames in os.walk(repo_path):
-        dirs[:] = [d for d in dirs if d not in {".git", "__pycache__", "node_modules", ".venv", "venv", ".pytest_cache", ".tox", "tests"}]
-        for fname in filenames:
-            if fname.endswith(".py") and not fname.startswith("test_") and not fname.endswith("_test.py"):
-                rel = os.path.relpath(os.path.join(root, fname), repo_path).replace("\\", "/")
-                files.add(rel)
+    # 2. Also include all source .py files (non-test files)
+    if source_files is None:
+        source_files = _list_source_files(repo_path)
+    files.update(source_files)
 
     return sorted(files)
 
 
-def read_file_contents(repo_path: str, file_paths: list) -> dict:
-    """Read the contents of the specified files from the repo."""
+def _read_one(full_path: str, limit: int = None):
+    """
+    Read one file -> (content, error, truncated); content is None if it
+    doesn't exist. With a limit, at most that many chars are read.
+    """
+    try:
+        with open(full_path, "r", encoding="utf-8") as f:
+            if limit is None:
+                return f.read(), None, False
+            content = f.read(limit + 1)
+    except FileNotFoundError:
+        return None, None, False
+    except Exception as e:
+        return None, e, False
+
+    if len(content) <= limit:
+        return content, None, False
+    # Cut at a line boundary so the last line isn't half a statement
+    cut = content.rfind("\n", 0, limit)
+    content = content[:cut + 1 if cut != -1 else limit]
+    return content + TRUNCATED_MARKER, None, True
+
+
+def read_file_contents(repo_path: str, file_paths: list, errors: list = None) -> dict:
+    """
+    Read the contents of the specified files from the repo.
+
+    Files with a line-numbered error are read whole — the LLM prompt only
+    shows windows around those lines, and line numbers must stay true.
+    Any other file is cut after MAX_FILE_CHARS.
+    """
+    error_files = {e.get("file") for e in errors or () if isinstance(e.get("line"), int) and e["line"] > 0}
+    jobs = [
+        (os.path.join(repo_path, fp), None if fp in error_files else MAX_FILE_CHARS)
+        for fp in file_paths
+    ]
+    # Reads release the GIL, so a small pool overlaps the per-file open/read
+    if len(jobs) > 1:
+        with ThreadPoolExecutor(max_workers=min(READ_WORKERS, len(jobs))) as ex:
+            results = list(ex.map(lambda job: _read_one(*job), jobs))
+    else:
+        results = [_read_one(*job) for job in jobs]
+
+    # Log from this thread, in request order
     contents = {}
-    for fp in file_paths:
-        full_path = os.path.join(repo_path, fp)
-        if os.path.exists(full_path):
-            try:
-                with open(full_path, "r", encoding="utf-8") as f:
-                    contents[fp] = f.read()
-                _info("READ", f"Read {fp} ({len(contents[fp])} chars)")
-            except Exception as e:
-                contents[fp] = f"<Error reading file: {e}>"
-                _info("ERROR", f"Error reading {fp}: {e}")
-        else:
+    for fp, (content, err, truncated) in zip(file_paths, results):
+        if err is not None:
+            contents[fp] = f"<Error reading file: {err}>"
+            _info("ERROR", f"Error reading {fp}: {err}")
+        elif content is None:
             _info("WARN", f"File not found: {fp}")
+        else:
+            contents[fp] = content
+            note = f", truncated at {MAX_FILE_CHARS}" if truncated else ""
+            _info("READ", f"Read {fp} ({len(content)} chars{note})")
     return contents
 
 
+# ═══════════════════════════════════════════════════════════════════
+#  SSE EVENT BATCHING
+# ═══════════════════════════════════════════════════════════════════
+
+class BatchedEmitter:
+    """
+    Buffer pipeline events and hand them to `callback` in batches, as one
+    ("batch", {"events": [{"type": ..., **data}, ...]}) call. A lone event
+    is passed through unchanged. Terminal events flush immediately.
+    """
+
+    FLUSH_NOW = frozenset({"done", "error"})
+
+    def __init__(self, callback, interval: float = EMIT_BATCH_INTERVAL, max_events: int = EMIT_BATCH_SIZE):
+        self._callback = callback
+        self._interval = interval
+        self._max_events = max_events
+        self._buffer = []
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def emit(self, event_type: str, data: dict):
+        with self._lock:
+            self._buffer.append((event_type, data))
+            if event_type in self.FLUSH_NOW or len(self._buffer) >= self._max_events:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self._interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        """Send anything still buffered and stop the timer."""
+        self.flush()
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        if len(batch) == 1:
+            self._callback(*batch[0])
+        else:
+            self._callback("batch", {"events": [{"type": t, **d} for t, d in batch]})
+
+
+# ═══════════════════════════════════════════════════════════════════
+#  LLM RESPONSE CACHE — identical code + errors get the same fixes
+# ═══════════════════════════════════════════════════════════════════
+
+def _llm_cache_path(tree: str, file_contents: dict, errors: list) -> str:
+    key_src = json.dumps({
+        "provider": llm.LLM_PROVIDER,
+        "model": {"cerebras": llm.CEREBRAS_MODEL, "gemini": llm.GEMINI_MODEL}.get(llm.LLM_PROVIDER, llm.OPENROUTER_MODEL),
+        "tree": tree,
+        "files": file_contents,
+        "errors": errors,
+    }, sort_keys=True, default=str)
+    key = hashlib.sha256(key_src.encode("utf-8")).hexdigest()
+    return os.path.join(LLM_CACHE_DIR, key[:2], f"{key}.json")
+
+
+def _load_llm_cache(cache_path: str):
+    """Return a cached fix_response, or None if missing or older than the TTL."""
+    try:
+        if time.time() - os.path.getmtime(cache_path) > LLM_CACHE_TTL:
+            return None
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_llm_cache(cache_path: str, fix_response: dict):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(fix_response, f)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        _info("WARN", f"Could not write LLM cache: {e}")
+
+
+def _ask_for_fixes_cached(tree: str, file_contents: dict, errors: list):
+    """
+    ask_for_fixes() with a disk cache in front of it.
+
+    Returns:
+        (fix_response, is_cached)
+    """
+    # Dummy replies are canned — never let them stand in for a real LLM's
+    if llm.USE_DUMMY_LLM or LLM_CACHE_TTL <= 0:
+        return ask_for_fixes(tree, file_contents, errors), False
+
+    cache_path = _llm_cache_path(tree, file_contents, errors)
+    cached = _load_llm_cache(cache_path)
+    if cached is not None:
+        _info("CACHE", f"Reusing cached LLM response ({os.path.basename(cache_path)[:12]})")
+        return cached, True
+
+    fix_response = ask_for_fixes(tree, file_contents, errors)
+    # Empty replies may be transient (rate limits, bad JSON) — retry those next time
+    if fix_response.get("fixes"):
+        _save_llm_cache(cache_path, fix_response)
+    return fix_response, False
+
+
+# ═══════════════════════════════════════════════════════════════════
+#  ANALYSIS CACHE — skip analyze_repo for an already-seen commit
+# ═══════════════════════════════════════════════════════════════════
+
+def _analyze_repo_cached(repo_url: str, repo_path: str):
+    """
+    analyze_repo() with a disk cache keyed by repo URL + HEAD commit.
+
+    Returns:
+        (analysis, is_cached)
+    """
+    head = head_commit(repo_path)
+    if not head:
+        return analyze_repo(repo_path), False
+
+    url_key = hashlib.sha1(repo_url.encode("utf-8")).hexdigest()
+    cache_path = os.path.join(ANALYSIS_CACHE_DIR, f"{url_key}_{head}.json")
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            analysis = json.load(f)
+        _info("CACHE", f"Reusing analysis for commit {head[:8]}")
+        return analysis, True
+    except (OSError, ValueError):
+        pass
+
+    analysis = analyze_repo(repo_path)
+    try:
+        os.makedirs(ANALYSIS_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(analysis, f)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        _info("WARN", f"Could not write analysis cache: {e}")
+    return analysis, False
+
+
+# ═══════════════════════════════════════════════════════════════════
+#  RUN LOG — full iteration records on disk, summaries in memory
+# ═══════════════════════════════════════════════════════════════════
+
+def _append_run_log(run_log_path: str, record: dict):
+    """Append one iteration record to the run's JSONL log."""
+    try:
+        os.makedirs(RUNS_DIR, exist_ok=True)
+        with open(run_log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+    except OSError as e:
+        _info("WARN", f"Failed to write run log: {e}")
+
+
+def _iteration_summary(record: dict) -> dict:
+    """The small in-memory view of an iteration record."""
+    commit = record.get("commit") or {}
+    summary = {
+        "iteration": record["iteration"],
+        "timestamp": record.get("timestamp", ""),
+        "status": record.get("status", ""),
+        "passed": record.get("passed", 0),
+        "failed": record.get("failed", 0),
+        "error_count": len(record.get("errors", [])),
+        "fixes_applied": sum(1 for f in record.get("fixes_applied", []) if f.get("status") == "applied"),
+        "commit_hash": commit.get("commit_hash", ""),
+    }
+    if record.get("is_deterministic"):
+        summary["is_deterministic"] = True
+    return summary
+
+
 # ═══════════════════════════════════════════════════════════════════
 #  MAIN PIPELINE
 # ═══════════════════════════════════════════════════════════════════
 
 def run_pipeline(repo_url: str, team_name: str, leader_name: str,
-                 status_callback=None, event_callback=None) -> dict:
+                 status_callback=None, event_callback=None, clone_opts: dict = None) -> dict:
     """
     Run the full CI/CD healing pipeline with two-pass fix strategy.
 
     Pass 1: Deterministic fixes (no LLM) — handles SYNTAX, IMPORT, LINTING, INDENTATION
     Pass 2: LLM fixes (if needed)       — handles LOGIC, TYPE_ERROR
+
+    clone_opts is passed through to clone_repo (see there for keys).
+    event_callback(event_type, data) receives JSON-native data only (dict,
+    list, str, int, float, bool, None), so the server can serialize it
+    without a per-object fallback.
     """
     start_time = time.time()
     result = {
@@ -141,13 +463,35 @@ def run_pipeline(repo_url: str, team_name: str, leader_name: str,
         if status_callback:
             status_callback(msg)
 
+    emitter = BatchedEmitter(event_callback) if event_callback else None
+
     def emit(event_type, data):
-        """Emit an SSE event to the frontend."""
-        if event_callback:
-            event_callback(event_type, data)
+        """Queue an SSE event for the frontend (sent in small batches)."""
+        if emitter:
+            emitter.emit(event_type, data)
+
+    def _emit_detection_done(future):
+        """Done-callback for the background deterministic detection."""
+        if future.exception() is not None:
+            emit("step", {"step": "deterministic", "message": "Deterministic bug detection failed — retrying inline"})
+            return
+        count = len(future.result()["fixes"])
+        emit("step", {"step": "deterministic", "message": f"Deterministic bug detection done: {count} fixes found"})
+
+    run_id = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+    run_log_path = os.path.join(RUNS_DIR, f"{run_id}.jsonl")
+    result["run_id"] = run_id
+    result["run_log"] = run_log_path
+
+    def record_iteration(record):
+        """Stream the full record to the run log; keep only its summary."""
+        _append_run_log(run_log_path, record)
+        result["iterations"].append(_iteration_summary(record))
 
     # Track whether pip install has been done
     deps_installed = False
+    source_files = None  # listed on first use, then reused every iteration
+    test_duration = None  # last real test run's duration, bounds the next one's timeout
 
     try:
         # ═══════════════════════════════════════════════════════════
@@ -160,7 +504,7 @@ def run_pipeline(repo_url: str, team_name: str, leader_name: str,
         update_status("Cloning repository...")
         emit("step", {"step": "clone", "message": f"Cloning {repo_url}..."})
 
-        repo_path = clone_repo(repo_url, WORKSPACE_DIR)
+        repo_path = clone_repo(repo_url, WORKSPACE_DIR, clone_opts)
         _info("CLONE", f"Cloned to: {repo_path}")
 
         emit("clone", {
@@ -170,6 +514,13 @@ def run_pipeline(repo_url: str, team_name: str, leader_name: str,
             "message": "Repository cloned successfully",
         })
 
+        # Deterministic detection only reads the working tree, so it runs on
+        # a background thread while the main thread analyzes and branches
+        det_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="det-fixer")
+        det_future = det_executor.submit(detect_and_fix_deterministic, repo_path)
+        det_future.add_done_callback(_emit_detection_done)
+        det_executor.shutdown(wait=False)
+
         # ═══════════════════════════════════════════════════════════
         #  STEP 2: ANALYZE REPOSITORY (done ONCE, not every iteration)
         # ═══════════════════════════════════════════════════════════
@@ -177,7 +528,7 @@ def run_pipeline(repo_url: str, team_name: str, leader_name: str,
         update_status("Analyzing repository structure...")
         emit("step", {"step": "analyze", "message": "Analyzing repository structure..."})
 
-        analysis = analyze_repo(repo_path)
+        analysis, _ = _analyze_repo_cached(repo_url, repo_path)
 
         result["analysis"] = {
             "tree": analysis["tree"],
@@ -189,8 +540,7 @@ def run_pipeline(repo_url: str, team_name: str, leader_name: str,
         _info("ANALYZE", f"Language detected: {analysis['language']}")
         _info("ANALYZE", f"Test command: {analysis['test_command']}")
         _info("ANALYZE", f"Test files found: {len(analysis['test_files'])}")
-        for tf in analysis["test_files"]:
-            _info("ANALYZE", f"  - {tf}")
+        _info_lines("ANALYZE", (f"  - {tf}" for tf in analysis["test_files"]))
 
         _print_block("FILE STRUCTURE TREE", analysis["tree"])
 
@@ -222,19 +572,29 @@ def run_pipeline(repo_url: str, team_name: str, leader_name: str,
         # ═══════════════════════════════════════════════════════════
         _banner("STEP 4: DETERMINISTIC FIX PASS (NO LLM)")
         update_status("Running deterministic bug detection (no LLM)...")
-        emit("step", {"step": "deterministic", "message": "Running deterministic bug detection..."})
 
-        det_result = detect_and_fix_deterministic(repo_path)
+        try:
+            det_result = det_future.result()
+        except Exception as e:
+            # A failed background pass must not fail the run — detect again here
+            _info("WARN", f"Background deterministic detection failed ({e!r}) — retrying inline")
+            det_result = detect_and_fix_deterministic(repo_path)
+        det_applied = []
+
+        for det_pass in range(1, MAX_DETERMINISTIC_PASSES + 1):
+            if not det_result["fixes"]:
+                break
 
-        if det_result["fixes"]:
-            _info("DETERMINISTIC", f"Found {len(det_result['fixes'])} deterministic fixes")
+            cached_note = " (cached — sources unchanged)" if det_result.get("cached") else ""
+            _info("DETERMINISTIC", f"Pass {det_pass}: found {len(det_result['fixes'])} deterministic fixes{cached_note}")
 
             emit("fixes", {
                 "iteration": 0,
                 "fixes": det_result["fixes"],
                 "commit_title": det_result["commit_title"],
-                "message": f"Deterministic: {len(det_result['fixes'])} fixes (no LLM needed)",
+                "message": f"Deterministic: {len(det_result['fixes'])} fixes (no LLM needed){cached_note}",
                 "is_deterministic": True,
+                "is_cached": bool(det_result.get("cached")),
             })
 
             # Apply deterministic fixes
@@ -243,6 +603,7 @@ def run_pipeline(repo_url: str, team_name: str, leader_name: str,
             failed_count = sum(1 for f in applied if f["status"] == "failed")
             result["total_fixes_applied"] += applied_count
             result["all_fixes"].extend(applied)
+            det_applied.extend(applied)
 
             _info("DETERMINISTIC", f"Applied: {applied_count} | Failed: {failed_count}")
 
@@ -255,34 +616,51 @@ def run_pipeline(repo_url: str, team_name: str, leader_name: str,
                 "is_deterministic": True,
             })
 
-            if applied_count > 0:
-                # Commit deterministic fixes
-                commit_msg = det_result["commit_title"]
-                commit_result = commit_and_push(repo_path, commit_msg, branch_name)
-
-                _info("GIT", f"Committed deterministic fixes: {commit_result.get('commit_hash', 'N/A')}")
-
-                emit("commit", {
-                    "iteration": 0,
-                    "commit_hash": commit_result.get("commit_hash", ""),
-                    "branch": commit_result.get("branch", ""),
-                    "push_success": commit_result.get("push_success", False),
-                    "commit_message": commit_msg,
-                    "message": f"Committed deterministic fixes",
-                    "is_deterministic": True,
+            # Linting/indentation are skipped while syntax errors exist —
+            # re-run detection now that the tree parses
+            if not det_result.get("phases_skipped") or applied_count == 0:
+                break
+            _info("DETERMINISTIC", "Syntax fixes applied — re-running detection for remaining phases")
+            det_result = detect_and_fix_deterministic(repo_path)
+        else:
+            # Out of passes with the last re-detection's fixes unapplied; the
+            # test iterations only re-run detection if the tests still fail
+            left = len(det_result["fixes"])
+            if left:
+                _info("DETERMINISTIC", f"Pass limit ({MAX_DETERMINISTIC_PASSES}) reached — {left} detected fixes not applied")
+                emit("step", {
+                    "step": "deterministic",
+                    "message": f"Deterministic pass limit reached — {left} detected fixes not applied",
                 })
 
-                # Record this as iteration 0
-                result["iterations"].append({
-                    "iteration": 0,
-                    "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-                    "status": "DETERMINISTIC_FIX",
-                    "passed": 0,
-                    "failed": 0,
-                    "fixes_applied": applied,
-                    "commit": commit_result,
-                    "is_deterministic": True,
-                })
+        if any(f["status"] == "applied" for f in det_applied):
+            # Commit deterministic fixes
+            commit_msg = det_result["commit_title"]
+            commit_result = commit_and_push(repo_path, commit_msg, branch_name)
+
+            _info("GIT", f"Committed deterministic fixes: {commit_result.get('commit_hash', 'N/A')}")
+
+            emit("commit", {
+                "iteration": 0,
+                "commit_hash": commit_result.get("commit_hash", ""),
+                "branch": commit_result.get("branch", ""),
+                "push_success": commit_result.get("push_success", False),
+                "commit_message": commit_msg,
+                "message": f"Committed deterministic fixes",
+                "is_deterministic": True,
+            })
+
+            # Record this as iteration 0
+            record_iteration({
+                "iteration": 0,
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "status": "DETERMINISTIC_FIX",
+                "passed": 0,
+                "failed": 0,
+                "fixes_applied": det_applied,
+                "commit": commit_result,
+                "is_deterministic": True,
+            })
         else:
             _info("DETERMINISTIC", "No deterministic fixes needed")
 
@@ -313,8 +691,16 @@ def run_pipeline(repo_url: str, team_name: str, leader_name: str,
             update_status(f"Iteration {iteration}/{MAX_ITERATIONS}: Running tests...")
             emit("step", {"step": "testing", "iteration": iteration, "message": "Running test suite..."})
 
-            test_results = run_tests(repo_path, analysis["test_command"], skip_deps=deps_installed)
+            def _on_test_failure(test_id, _iteration=iteration):
+                emit("step", {"step": "testing", "iteration": _iteration, "message": f"FAILED {test_id}"})
+
+            test_results = run_tests(
+                repo_path, analysis["test_command"], skip_deps=deps_installed, on_failure=_on_test_failure,
+                prev_duration=test_duration,
+            )
             deps_installed = True  # Mark deps as installed after first run
+            if _ran_tests(test_results):
+                test_duration = test_results["duration"]
 
             iter_result["passed"] = test_results["passed"]
             iter_result["failed"] = test_results["failed"]
@@ -326,8 +712,10 @@ def run_pipeline(repo_url: str, team_name: str, leader_name: str,
 
             if test_results["errors"]:
                 _section("PARSED ERROR DETAILS")
-                for i, err in enumerate(test_results["errors"], 1):
-                    _info("ERROR", f"  #{i}: {err.get('test_name', '?')} | {err.get('file', '?')}:{err.get('line', '?')} | {err.get('error_message', '?')}")
+                _info_lines("ERROR", (
+                    f"  #{i}: {err.get('test_name', '?')} | {err.get('file', '?')}:{err.get('line', '?')} | {err.get('error_message', '?')}"
+                    for i, err in enumerate(test_results["errors"], 1)
+                ))
 
             emit("test_result", {
                 "iteration": iteration,
@@ -335,13 +723,13 @@ def run_pipeline(repo_url: str, team_name: str, leader_name: str,
                 "failed": test_results["failed"],
                 "error_count": len(test_results["errors"]),
                 "errors": test_results["errors"],
-                "raw_output": test_results["raw_output"][:3000],
+                "raw_output": test_results["raw_output"][-3000:],
             })
 
             # If all pass, we're done!
             if test_results["failed"] == 0 and len(test_results["errors"]) == 0:
                 iter_result["status"] = "PASSED"
-                result["iterations"].append(iter_result)
+                record_iteration(iter_result)
                 result["final_status"] = "PASSED"
 
                 _banner(f"ALL TESTS PASSED ON ITERATION {iteration}!")
@@ -355,13 +743,61 @@ def run_pipeline(repo_url: str, team_name: str, leader_name: str,
 
             result["total_failures_detected"] += test_results["failed"] + len(test_results["errors"])
 
+            # ─── Deterministic-only errors: re-run Pass 1 instead of the LLM ───
+            kinds = {_classify(e) for e in test_results["errors"]}
+            _info("CLASSIFY", f"Error kinds: {', '.join(sorted(kinds)) or 'none'}")
+            if kinds and kinds <= DETERMINISTIC_KINDS:
+                _section(f"ITERATION {iteration} — DETERMINISTIC RE-RUN (NO LLM)")
+                det_result = detect_and_fix_deterministic(repo_path)
+                applied = apply_fixes(repo_path, det_result["fixes"]) if det_result["fixes"] else []
+                applied_count = sum(1 for f in applied if f["status"] == "applied")
+
+                if applied_count:
+                    result["total_fixes_applied"] += applied_count
+                    result["all_fixes"].extend(applied)
+                    iter_result["fixes_applied"] = applied
+                    _info("DETERMINISTIC", f"Applied {applied_count}/{len(applied)} fixes — skipping LLM")
+
+                    emit("fix_applied", {
+                        "iteration": iteration,
+                        "applied": applied_count,
+                        "failed": len(applied) - applied_count,
+                        "details": applied,
+                        "message": f"Deterministic: Applied {applied_count}/{len(applied)} fixes (no LLM needed)",
+                        "is_deterministic": True,
+                    })
+
+                    commit_result = commit_and_push(repo_path, det_result["commit_title"], branch_name)
+                    iter_result["commit"] = commit_result
+                    emit("commit", {
+                        "iteration": iteration,
+                        "commit_hash": commit_result.get("commit_hash", ""),
+                        "branch": commit_result.get("branch", ""),
+                        "push_success": commit_result.get("push_success", False),
+                        "commit_message": det_result["commit_title"],
+                        "message": "Committed deterministic fixes",
+                        "is_deterministic": True,
+                    })
+
+                    iter_result["status"] = "DETERMINISTIC_FIX"
+                    record_iteration(iter_result)
+                    emit("iteration_complete", {
+                        "iteration": iteration,
+                        "fixes_applied": applied_count,
+                        "message": f"Iteration {iteration} complete — {applied_count} deterministic fixes applied. Re-testing...",
+                    })
+                    continue
+
+                _info("DETERMINISTIC", "Deterministic fixer found nothing to apply — falling back to LLM")
+
             # ─── Discover source files from errors (NO LLM CALL) ───
             _section(f"ITERATION {iteration} — DISCOVERING SOURCE FILES (NO LLM)")
-            files_needed = _discover_source_files_from_errors(repo_path, test_results["errors"])
+            if source_files is None:
+                source_files = _list_source_files(repo_path)
+            files_needed = _discover_source_files_from_errors(repo_path, test_results["errors"], source_files)
 
             _info("FILES", f"Discovered {len(files_needed)} source files:")
-            for fn in files_needed:
-                _info("FILES", f"  - {fn}")
+            _info_lines("FILES", (f"  - {fn}" for fn in files_needed))
 
             emit("files_needed", {
                 "iteration": iteration,
@@ -370,7 +806,7 @@ def run_pipeline(repo_url: str, team_name: str, leader_name: str,
             })
 
             # ─── Read source files ───
-            file_contents = read_file_contents(repo_path, files_needed)
+            file_contents = read_file_contents(repo_path, files_needed, test_results["errors"])
 
             emit("file_contents", {
                 "iteration": iteration,
@@ -383,12 +819,12 @@ def run_pipeline(repo_url: str, team_name: str, leader_name: str,
             update_status(f"Iteration {iteration}: Asking LLM for fixes (LOGIC/TYPE_ERROR only)...")
             emit("step", {"step": "llm_fixes", "iteration": iteration, "message": "Asking LLM for code fixes..."})
 
-            fix_response = ask_for_fixes(analysis["tree"], file_contents, test_results["errors"])
+            fix_response, is_cached = _ask_for_fixes_cached(analysis["tree"], file_contents, test_results["errors"])
 
             if not fix_response["fixes"]:
                 _info("WARN", "LLM returned NO fixes. Stopping pipeline.")
                 iter_result["status"] = "NO_FIXES"
-                result["iterations"].append(iter_result)
+                record_iteration(iter_result)
                 result["final_status"] = "FAILED"
                 update_status("No fixes could be generated. Stopping.")
 
@@ -399,14 +835,17 @@ def run_pipeline(repo_url: str, team_name: str, leader_name: str,
                 break
 
             _info("FIXES", f"LLM returned {len(fix_response['fixes'])} fixes")
-            for i, fix in enumerate(fix_response["fixes"], 1):
-                _info("FIXES", f"  #{i}: [{fix.get('bug_type', '?')}] {fix.get('file', '?')}:{fix.get('line', '?')} — {fix.get('description', '?')}")
+            _info_lines("FIXES", (
+                f"  #{i}: [{fix.get('bug_type', '?')}] {fix.get('file', '?')}:{fix.get('line', '?')} — {fix.get('description', '?')}"
+                for i, fix in enumerate(fix_response["fixes"], 1)
+            ))
 
             emit("fixes", {
                 "iteration": iteration,
                 "fixes": fix_response["fixes"],
                 "commit_title": fix_response["commit_title"],
-                "message": f"LLM generated {len(fix_response['fixes'])} fixes",
+                "message": f"LLM generated {len(fix_response['fixes'])} fixes" + (" (cached)" if is_cached else ""),
+                "is_cached": is_cached,
             })
 
             # ─── Apply fixes ───
@@ -435,7 +874,7 @@ def run_pipeline(repo_url: str, team_name: str, leader_name: str,
             if applied_count == 0:
                 _info("WARN", "No fixes could be applied. Stopping pipeline.")
                 iter_result["status"] = "NO_FIXES_APPLIED"
-                result["iterations"].append(iter_result)
+                record_iteration(iter_result)
                 result["final_status"] = "FAILED"
                 update_status("No fixes could be applied. Stopping.")
 
@@ -469,7 +908,7 @@ def run_pipeline(repo_url: str, team_name: str, leader_name: str,
             })
 
             iter_result["status"] = "FIXED"
-            result["iterations"].append(iter_result)
+            record_iteration(iter_result)
 
             _banner(f"ITERATION {iteration} COMPLETE — {applied_count} fixes applied, re-testing...")
 
@@ -525,6 +964,8 @@ def run_pipeline(repo_url: str, team_name: str, leader_name: str,
         "time_taken": result["time_taken"],
         "result": result,
     })
+    if emitter:
+        emitter.close()
 
     # ═══════════════════════════════════════════════════════════════
     #  GENERATE results.json (mandatory per problem statement)
@@ -538,3 +979,20 @@ def run_pipeline(repo_url: str, team_name: str, leader_name: str,
         _info("WARN", f"Failed to write results.json: {e}")
 
     return result
+
+
+def run_pipeline_child(repo_url: str, team_name: str, leader_name: str, out_queue):
+    """
+    multiprocessing target: run_pipeline in a child process, forwarding its
+    callbacks over out_queue as ("status", msg) and ("event", type, data),
+    then one final ("result", result) or ("error", message).
+    """
+    try:
+        result = run_pipeline(
+            repo_url, team_name, leader_name,
+            status_callback=lambda msg: out_queue.put(("status", msg)),
+            event_callback=lambda event_type, data: out_queue.put(("event", event_type, data)),
+        )
+        out_queue.put(("result", result))
+    except Exception as e:
+        out_queue.put(("error", str(e)))
@@ -4,10 +4,168 @@ Run tests in the cloned repository and parse the results.
 
 import os
 import re
+import sys
+import json
+import time
+import hashlib
+import shutil
+import tempfile
+import threading
 import subprocess
 
+# Pytest output patterns
+# "FAILED tests/test_calculator.py::test_add - AssertionError: ..."
+_FAILED_RE = re.compile(r"FAILED\s+([\w/\\\.]+)::(\w+)")
+# One "_____ test_name _____" failure block, up to the next separator
+_ERROR_BLOCK_RE = re.compile(r"_{5,}\s+(\S+)\s+_{5,}(.*?)(?=_{5,}|\Z)", re.DOTALL)
+_FILE_LINE_RE = re.compile(r"([\w/\\]+\.py):(\d+)")
+# "ERROR collecting path.py" followed by its detail lines
+_COLLECT_RE = re.compile(r"ERROR\s+collecting\s+([\w/\\\.]+)\s*.*?\n(.*?)(?=\n\S|\Z)", re.DOTALL)
+_LINE_RE = re.compile(r"line\s+(\d+)")
+_PASSED_WORD_RE = re.compile(r"PASSED")
+_FAILED_WORD_RE = re.compile(r"FAILED")
+# Live per-test result line in -v mode: "tests/test_x.py::test_y FAILED [ 50%]"
+_VERBOSE_FAILED_RE = re.compile(r"^(\S+::\S+)\s+FAILED\b")
 
-def run_tests(repo_path: str, test_command: str, skip_deps: bool = False) -> dict:
+TEST_TIMEOUT = 300  # seconds
+# Once a run has executed tests, later runs get twice its duration (at least
+# this many seconds, at most TEST_TIMEOUT) before they're killed
+MIN_TEST_TIMEOUT = 30  # seconds
+# Only the tail of the test output is kept once parsed — that's where the
+# failure blocks and summary live
+RAW_OUTPUT_TAIL = 10000  # chars
+
+# Shared across runs: pip's wheel/http cache, and one marker file per
+# requirements.txt hash that installed cleanly
+_WORKSPACE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "workspace")
+PIP_CACHE_DIR = os.path.join(_WORKSPACE_DIR, ".pipcache")
+PIP_MARKER_DIR = os.path.join(_WORKSPACE_DIR, ".pipmark")
+# uv's resolver/installer is much faster than pip's; used when on PATH
+_UV_PATH = shutil.which("uv")
+
+# pytest-json-report gives structured results. Whether it's available
+# depends on the environment the test command runs in, not this one: a
+# pytest that rejects --json-report is re-run without it, and remembered
+_NO_JSON_REPORT = set()
+# pytest's exit code for a command-line usage error
+_PYTEST_USAGE_ERROR = 4
+
+
+def _tail(text: str, limit: int) -> str:
+    """Last `limit` chars of text, starting at a line boundary."""
+    if len(text) <= limit:
+        return text
+    tail = text[-limit:]
+    nl = tail.find("\n")
+    return tail[nl + 1:] if nl != -1 else tail
+
+
+def _stream_command(cmd_parts: list, repo_path: str, on_failure=None, timeout: float = TEST_TIMEOUT) -> tuple:
+    """
+    Run a test command, reading its merged stdout/stderr line by line as
+    it is produced. on_failure(test_id) is called once per failing test as
+    soon as pytest reports it.
+
+    Returns:
+        (returncode, output, saw_failure)
+
+    Raises:
+        subprocess.TimeoutExpired if the run exceeds timeout seconds.
+    """
+    proc = subprocess.Popen(
+        cmd_parts,
+        cwd=repo_path,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1,
+    )
+    # Reading stdout blocks, so the timeout is enforced by killing the process
+    timed_out = threading.Event()
+
+    def _kill():
+        timed_out.set()
+        proc.kill()
+
+    timer = threading.Timer(timeout, _kill)
+    timer.daemon = True
+    timer.start()
+
+    lines = []
+    reported = set()
+    saw_failure = False
+    try:
+        for line in proc.stdout:
+            lines.append(line)
+            if "FAILED" in line or "ERROR" in line:
+                saw_failure = True
+                m = _VERBOSE_FAILED_RE.match(line) or _FAILED_RE.match(line)
+                if m and on_failure:
+                    test_id = m.group(1) if m.re is _VERBOSE_FAILED_RE else f"{m.group(1)}::{m.group(2)}"
+                    if test_id not in reported:
+                        reported.add(test_id)
+                        on_failure(test_id)
+        proc.wait()
+    finally:
+        timer.cancel()
+        proc.stdout.close()
+
+    output = "".join(lines)
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(cmd_parts, timeout, output=output)
+    return proc.returncode, output, saw_failure
+
+
+def _install_requirements(repo_path: str, req_path: str):
+    """
+    pip install a requirements file, skipping it entirely when the same
+    file contents already installed cleanly in an earlier run.
+    """
+    with open(req_path, "rb") as f:
+        req_hash = hashlib.sha256(f.read()).hexdigest()
+    marker = os.path.join(PIP_MARKER_DIR, req_hash)
+    if os.path.exists(marker):
+        print(f"[TEST_RUNNER] Dependencies already installed (requirements {req_hash[:12]})")
+        return
+
+    pip_cmd = ["pip", "install", "--prefer-binary", "--cache-dir", PIP_CACHE_DIR, "-r", req_path]
+    result = None
+    if _UV_PATH:
+        # uv keeps its own cache (~/.cache/uv); --python targets the
+        # interpreter that will run the tests, venv or not
+        print("[TEST_RUNNER] Installing dependencies (uv)...")
+        result = subprocess.run(
+            [_UV_PATH, "pip", "install", "--python", sys.executable, "-r", req_path],
+            cwd=repo_path,
+            capture_output=True,
+            text=True,
+            timeout=120,
+        )
+        if result.returncode != 0:
+            print(f"[TEST_RUNNER] uv pip install failed (exit {result.returncode}), retrying with pip")
+            result = None
+
+    if result is None:
+        print("[TEST_RUNNER] Installing dependencies...")
+        result = subprocess.run(
+            pip_cmd,
+            cwd=repo_path,
+            capture_output=True,
+            text=True,
+            timeout=120,
+        )
+    if result.returncode != 0:
+        print(f"[TEST_RUNNER] pip install failed (exit {result.returncode}), not caching")
+        return
+    try:
+        os.makedirs(PIP_MARKER_DIR, exist_ok=True)
+        open(marker, "w").close()
+    except OSError:
+        pass
+
+
+def run_tests(repo_path: str, test_command: str, skip_deps: bool = False, on_failure=None,
+              prev_duration: float = None) -> dict:
     """
     Run the test suite and parse results.
     
@@ -15,9 +173,14 @@ def run_tests(repo_path: str, test_command: str, skip_deps: bool = False) -> dic
         repo_path: Path to the cloned repository.
         test_command: Command to run tests (e.g., 'pytest -v').
         skip_deps: If True, skip installing dependencies (already done).
+        on_failure: Optional callback(test_id), called live for each failing test.
+        prev_duration: Seconds the last run that executed tests took; bounds
+            this run's timeout.
     
     Returns:
-        dict with keys: passed, failed, errors, raw_output
+        dict with keys: passed, failed, errors, raw_output, duration,
+        timed_out. A run that times out is reported as failed, with a
+        "timeout" error entry, rather than raised.
     """
     print(f"[TEST_RUNNER] Running: {test_command} in {repo_path}")
 
@@ -25,43 +188,150 @@ def run_tests(repo_path: str, test_command: str, skip_deps: bool = False) -> dic
     if not skip_deps:
         req_path = os.path.join(repo_path, "requirements.txt")
         if os.path.exists(req_path):
-            print("[TEST_RUNNER] Installing dependencies...")
-            subprocess.run(
-                ["pip", "install", "-r", req_path],
-                cwd=repo_path,
-                capture_output=True,
-                text=True,
-                timeout=120,
-            )
+            _install_requirements(repo_path, req_path)
     else:
         print("[TEST_RUNNER] Skipping dependency install (cached)")
 
     # Run the tests
     cmd_parts = test_command.split()
-    result = subprocess.run(
-        cmd_parts,
-        cwd=repo_path,
-        capture_output=True,
-        text=True,
-        timeout=300,
-    )
 
-    raw_output = result.stdout + "\n" + result.stderr
-    print(f"[TEST_RUNNER] Return code: {result.returncode}")
+    # The report goes outside the repo so commit_and_push never stages it
+    report_path = None
+    run_parts = cmd_parts
+    pytest_path = None
+    if cmd_parts and os.path.basename(cmd_parts[0]) == "pytest":
+        pytest_path = shutil.which(cmd_parts[0]) or cmd_parts[0]
+    if pytest_path is not None and pytest_path not in _NO_JSON_REPORT:
+        fd, report_path = tempfile.mkstemp(prefix="pytest_report_", suffix=".json")
+        os.close(fd)
+        run_parts = cmd_parts + ["--json-report", f"--json-report-file={report_path}"]
+
+    if prev_duration is None:
+        timeout = TEST_TIMEOUT
+    else:
+        timeout = min(TEST_TIMEOUT, max(MIN_TEST_TIMEOUT, int(2 * prev_duration)))
+
+    start = time.time()
+    timed_out = False
+    try:
+        try:
+            returncode, raw_output, saw_failure = _stream_command(run_parts, repo_path, on_failure, timeout)
+            if report_path and returncode == _PYTEST_USAGE_ERROR and "--json-report" in raw_output:
+                # The plugin isn't installed where this pytest runs
+                print(f"[TEST_RUNNER] {pytest_path} has no pytest-json-report — parsing stdout instead")
+                _NO_JSON_REPORT.add(pytest_path)
+                returncode, raw_output, saw_failure = _stream_command(cmd_parts, repo_path, on_failure, timeout)
+            report = _load_json_report(report_path) if report_path else None
+        except subprocess.TimeoutExpired as e:
+            # Reported as a failed run, so the pipeline carries on to the
+            # next iteration; the partial output is still parsed below
+            print(f"[TEST_RUNNER] Timed out after {timeout}s")
+            timed_out = True
+            returncode, raw_output, saw_failure, report = None, e.output or "", True, None
+    finally:
+        if report_path:
+            try:
+                os.remove(report_path)
+            except OSError:
+                pass
+
+    duration = time.time() - start
+    print(f"[TEST_RUNNER] Return code: {returncode} ({duration:.1f}s, timeout {timeout}s)")
 
     # Parse pytest output
-    errors = parse_pytest_output(raw_output, repo_path)
-    passed = len(re.findall(r"PASSED", raw_output))
-    failed = len(re.findall(r"FAILED", raw_output))
+    if report is not None:
+        passed, failed, errors = parse_json_report(report, repo_path)
+    else:
+        # Failure blocks only need the full-output regex pass if something failed
+        errors = parse_pytest_output(raw_output, repo_path) if saw_failure else []
+        passed = len(_PASSED_WORD_RE.findall(raw_output))
+        failed = len(_FAILED_WORD_RE.findall(raw_output))
+
+    if timed_out:
+        failed = max(failed, 1)
+        errors.append({
+            "test_name": "timeout",
+            "file": "",
+            "line": 0,
+            "error_message": f"Test run timed out after {timeout}s",
+        })
 
     return {
         "passed": passed,
         "failed": failed,
         "errors": errors,
-        "raw_output": raw_output,
+        "raw_output": _tail(raw_output, RAW_OUTPUT_TAIL),
+        "duration": duration,
+        "timed_out": timed_out,
     }
 
 
+def _load_json_report(report_path: str):
+    """Read the pytest-json-report file, or None if pytest didn't write one."""
+    try:
+        with open(report_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def parse_json_report(report: dict, repo_path: str) -> tuple:
+    """
+    Turn a pytest-json-report document into the same error dicts that
+    parse_pytest_output() produces.
+
+    Returns:
+        (passed, failed, errors)
+    """
+    errors = []
+
+    for test in report.get("tests", []):
+        if test.get("outcome") not in ("failed", "error"):
+            continue
+
+        # The failing stage — usually "call", "setup" for fixture errors
+        stage = next(
+            (test[name] for name in ("call", "setup", "teardown")
+             if test.get(name, {}).get("outcome") == "failed"),
+            {},
+        )
+        nodeid = test.get("nodeid", "")
+        test_file = nodeid.split("::", 1)[0]
+
+        # Deepest traceback frame inside the repo (pytest reports those relative)
+        file_path, line_num = test_file, test.get("lineno", -1) + 1
+        for entry in reversed(stage.get("traceback") or []):
+            if not os.path.isabs(entry.get("path", "")):
+                file_path, line_num = entry["path"], entry.get("lineno", 0)
+                break
+
+        message = (stage.get("crash") or {}).get("message", "").strip()
+        errors.append({
+            "test_name": nodeid.split("::", 1)[-1].replace("::", "."),
+            "file": file_path.replace("\\", "/"),
+            "line": line_num,
+            "error_message": message.split("\n", 1)[0] if message else f"Test {nodeid} failed",
+        })
+
+    # Collection errors (syntax errors, import errors)
+    for collector in report.get("collectors", []):
+        if collector.get("outcome") != "failed":
+            continue
+        file_path = collector.get("nodeid", "")
+        detail = collector.get("longrepr", "")
+        line_match = _LINE_RE.search(detail)
+        errors.append({
+            "test_name": f"collection_error:{file_path}",
+            "file": file_path.replace("\\", "/"),
+            "line": int(line_match.group(1)) if line_match else 0,
+            "error_message": detail.strip()[:200],
+        })
+
+    summary = report.get("summary", {})
+    failed = summary.get("failed", 0) + summary.get("error", 0)
+    return summary.get("passed", 0), failed, errors
+
+
 def parse_pytest_output(output: str, repo_path: str) -> list:
     """
     Parse pytest verbose output to extract failure details.
@@ -72,23 +342,15 @@ def parse_pytest_output(output: str, repo_path: str) -> list:
     errors = []
 
     # Match FAILED lines like: FAILED tests/test_calculator.py::test_add - AssertionError: ...
-    failed_pattern = re.compile(r"FAILED\s+([\w/\\\.]+)::(\w+)")
-    failed_matches = failed_pattern.findall(output)
-
-    # Also look for error sections in the output
-    # Pytest shows errors between ===== FAILURES ===== and ===== short test summary =====
-    failure_sections = re.split(r"_{3,}\s+([\w\.]+)\s+_{3,}", output)
+    failed_matches = _FAILED_RE.findall(output)
 
     # Parse individual error blocks
-    error_block_pattern = re.compile(
-        r"_{5,}\s+(\S+)\s+_{5,}(.*?)(?=_{5,}|\Z)",
-        re.DOTALL,
-    )
-    error_blocks = error_block_pattern.findall(output)
+    # Pytest shows errors between ===== FAILURES ===== and ===== short test summary =====
+    error_blocks = _ERROR_BLOCK_RE.findall(output)
 
     for test_name, block in error_blocks:
         # Try to extract file and line from the block
-        file_line_match = re.search(r"([\w/\\]+\.py):(\d+)", block)
+        file_line_match = _FILE_LINE_RE.search(block)
         file_path = file_line_match.group(1) if file_line_match else "unknown"
         line_num = int(file_line_match.group(2)) if file_line_match else 0
 
@@ -119,14 +381,10 @@ def parse_pytest_output(output: str, repo_path: str) -> list:
             })
 
     # Also catch collection errors (syntax errors, import errors)
-    collection_errors = re.findall(
-        r"ERROR\s+collecting\s+([\w/\\\.]+)\s*.*?\n(.*?)(?=\n\S|\Z)",
-        output,
-        re.DOTALL,
-    )
+    collection_errors = _COLLECT_RE.findall(output)
     for file_path, error_detail in collection_errors:
         # Try to find line number in error detail
-        line_match = re.search(r"line\s+(\d+)", error_detail)
+        line_match = _LINE_RE.search(error_detail)
         line_num = int(line_match.group(1)) if line_match else 0
 
         errors.append({
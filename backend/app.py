@@ -3,11 +3,16 @@ Flask API server for the CI/CD Healing Agent.
 Supports Server-Sent Events (SSE) for real-time frontend updates.
 """
 
+import datetime
 import json
+import multiprocessing
 import os
 import queue
 import threading
-from flask import Flask, jsonify, request, Response
+import time
+import zlib
+from typing import NamedTuple
+from flask import Flask, jsonify, request, Response, send_file
 from flask_cors import CORS
 
 # Load .env so GITHUB_TOKEN and other vars are available to all modules
@@ -17,85 +22,249 @@ try:
 except ImportError:
     pass
 
-from agent.pipeline import run_pipeline
+def _coerce(obj):
+    """Recursively turn a payload into JSON-native types (slow path only)."""
+    if isinstance(obj, dict):
+        return {k if isinstance(k, str) else str(k): _coerce(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return [_coerce(v) for v in obj]
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, os.PathLike):
+        return os.fspath(obj)
+    return str(obj)
+
+
+# orjson serializes SSE payloads faster and straight to bytes; json is the
+# fallback. Pipeline events are JSON-native, so neither is given a
+# per-object default= hook; a payload that isn't is coerced and retried
+try:
+    import orjson
+
+    def _dumps_event(obj) -> bytes:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return orjson.dumps(_coerce(obj))
+except ImportError:
+    def _dumps_event(obj) -> bytes:
+        try:
+            return json.dumps(obj).encode("utf-8")
+        except (TypeError, ValueError):
+            return json.dumps(_coerce(obj)).encode("utf-8")
+
+from agent.pipeline import run_pipeline, run_pipeline_child
+# Pure Python unless built with mypyc (see _broadcast.py)
+from _broadcast import SSEClientBuffer, SSERegistry, dispatch_forever
 
 app = Flask(__name__)
-CORS(app)
+# Behind a proxy that honours X-Sendfile, let it serve results.json itself
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE", "") == "1"
+# Allowed CORS origins, comma-separated (default: any). FastPath mirrors
+# only the wildcard policy; restricted origins are left to flask-cors
+CORS_ORIGINS = os.environ.get("CORS_ORIGINS", "*")
+CORS(app, origins=CORS_ORIGINS if CORS_ORIGINS == "*" else [o.strip() for o in CORS_ORIGINS.split(",")])
 
 # ═══════════════════════════════════════════════════════════════════
 #  IN-MEMORY STATE
 # ═══════════════════════════════════════════════════════════════════
 
-current_run = {
-    "status": "idle",
-    "message": "",
-    "result": None,
-}
-run_lock = threading.Lock()
+class RunState(NamedTuple):
+    """
+    Snapshot of the current run. Never mutated — replaced whole. A tuple,
+    so publishing a new one (every status message) is one cheap C-level
+    construction plus a single global rebind.
+    """
+    status: str
+    message: str
+    result: object
+
+
+# Rebinding a module global is atomic, so /api/status reads it without a
+# lock; only the pipeline's runner thread writes it
+_run_state = RunState(status="idle", message="", result=None)
+
+# Whether a run is claimed (queued or running). Flipped on by
+# _try_begin_run's compare-and-swap, off by the worker when the run ends
+_run_active = False
+_run_active_lock = threading.Lock()
+
+
+def _try_begin_run() -> bool:
+    """Claim the single run slot; False if a run is already in progress."""
+    global _run_active
+    with _run_active_lock:
+        if _run_active:
+            return False
+        _run_active = True
+        return True
+
+SSE_KEEPALIVE = 30  # seconds
+# Most frames written to a client in one chunk (one socket send)
+SSE_MAX_FRAMES_PER_WRITE = 256
+# gzip the event stream for clients that accept it (SSE_GZIP=0 turns it off)
+SSE_GZIP = os.environ.get("SSE_GZIP", "1") != "0"
 
-# All connected SSE clients get events pushed to their queues
-sse_clients = []
-sse_clients_lock = threading.Lock()
+sse_clients = SSERegistry()
+
+# results.json is kept in memory until its mtime/size changes, so polling
+# costs a stat(); files larger than this are streamed from disk instead
+RESULTS_PATH = os.path.join(os.path.dirname(__file__), "workspace", "results.json")
+RESULTS_CACHE_MAX_BYTES = 8 * 1024 * 1024
+_results_cache = {"key": None, "bytes": b"", "etag": ""}
+_results_cache_lock = threading.Lock()
+
+
+# Encoded '{"type":"<event_type>"' prefixes, one per event type seen
+_event_prefixes = {}
+
+
+def _encode_event(event_type: str, data: dict) -> bytes:
+    """
+    Encode {"type": event_type, **data} without building the merged dict:
+    a cached per-type prefix is spliced onto the encoded data object.
+    """
+    if "type" in data:
+        # data's own "type" wins in the merge — leave that to the generic path
+        return _dumps_event({"type": event_type, **data})
+    prefix = _event_prefixes.get(event_type)
+    if prefix is None:
+        prefix = _event_prefixes[event_type] = b'{"type":' + _dumps_event(event_type)
+    body = _dumps_event(data)
+    if body == b"{}":
+        return prefix + b"}"
+    return prefix + b"," + body[1:]
 
 
 def broadcast_event(event_type: str, data: dict):
-    """Push an SSE event to ALL connected clients."""
-    event_data = json.dumps({"type": event_type, **data}, default=str)
-    with sse_clients_lock:
-        dead = []
-        for q in sse_clients:
-            try:
-                q.put_nowait(event_data)
-            except Exception:
-                dead.append(q)
-        for q in dead:
-            sse_clients.remove(q)
+    """Queue an SSE event for ALL connected clients."""
+    # Serialized now, while `data` is as the caller sees it; every client
+    # buffer shares the same frame bytes. Fan-out happens on the dispatcher
+    # thread, so the pipeline never waits on the number of viewers
+    _dispatch_q.put(b"data: " + _encode_event(event_type, data) + b"\n\n")
+
+
+def _keepalive_pump():
+    """One timer for every stream: queue a keepalive comment each interval."""
+    while True:
+        time.sleep(SSE_KEEPALIVE)
+        if sse_clients.count:
+            _dispatch_q.put(_KEEPALIVE_FRAME)
+
+
+# Queued items are complete SSE frames — events and keepalives alike
+_KEEPALIVE_FRAME = b": keepalive\n\n"
+_dispatch_q = queue.SimpleQueue()
+# A spawned pipeline child re-imports this module (as __mp_main__ under
+# `python app.py`); only the server process runs the background threads
+_IS_SERVER_PROCESS = multiprocessing.parent_process() is None
+if _IS_SERVER_PROCESS:
+    threading.Thread(target=dispatch_forever, args=(_dispatch_q, sse_clients), name="sse-dispatcher", daemon=True).start()
+    threading.Thread(target=_keepalive_pump, name="sse-keepalive", daemon=True).start()
 
 
 # ═══════════════════════════════════════════════════════════════════
 #  BACKGROUND PIPELINE RUNNER
 # ═══════════════════════════════════════════════════════════════════
 
+# Run each pipeline in its own process (own GIL), so CPU-heavy pipeline
+# work can't stall the API and SSE threads; PIPELINE_SUBPROCESS=0 keeps it
+# in-process (easier to debug)
+PIPELINE_SUBPROCESS = os.environ.get("PIPELINE_SUBPROCESS", "1") != "0"
+_mp = multiprocessing.get_context("spawn")
+
+
+def _run_pipeline_subprocess(repo_url, team_name, leader_name, status_callback, event_callback):
+    """run_pipeline() in a child process; callbacks are replayed here."""
+    out_queue = _mp.Queue()
+    proc = _mp.Process(
+        target=run_pipeline_child,
+        args=(repo_url, team_name, leader_name, out_queue),
+        name="pipeline",
+    )
+    proc.start()
+    try:
+        while True:
+            try:
+                msg = out_queue.get(timeout=1)
+            except queue.Empty:
+                if not proc.is_alive():
+                    raise RuntimeError(f"Pipeline process exited unexpectedly (code {proc.exitcode})")
+                continue
+
+            kind = msg[0]
+            if kind == "event":
+                event_callback(msg[1], msg[2])
+            elif kind == "status":
+                status_callback(msg[1])
+            elif kind == "result":
+                return msg[1]
+            else:  # "error"
+                raise RuntimeError(msg[1])
+    finally:
+        # Not daemonic (the pipeline starts process pools of its own), so
+        # make sure a child that is stuck or failed doesn't outlive its run
+        proc.join(timeout=5)
+        if proc.is_alive():
+            proc.terminate()
+            proc.join()
+        out_queue.close()
+
+
 def run_agent_background(repo_url, team_name, leader_name):
     """Run the pipeline in a background thread, streaming events via SSE."""
-    global current_run
+    global _run_state
 
     def status_callback(msg):
-        with run_lock:
-            current_run["message"] = msg
+        global _run_state
+        _run_state = _run_state._replace(message=msg)
 
     def event_callback(event_type, data):
         """Called by pipeline.py to emit real-time events."""
         broadcast_event(event_type, data)
 
     try:
-        with run_lock:
-            current_run["status"] = "running"
-            current_run["message"] = "Starting pipeline..."
-            current_run["result"] = None
+        _run_state = RunState(status="running", message="Starting pipeline...", result=None)
 
         broadcast_event("status", {"message": "Pipeline started"})
 
-        result = run_pipeline(
-            repo_url, team_name, leader_name,
-            status_callback=status_callback,
-            event_callback=event_callback,
-        )
+        if PIPELINE_SUBPROCESS:
+            result = _run_pipeline_subprocess(
+                repo_url, team_name, leader_name, status_callback, event_callback
+            )
+        else:
+            result = run_pipeline(
+                repo_url, team_name, leader_name,
+                status_callback=status_callback,
+                event_callback=event_callback,
+            )
 
-        with run_lock:
-            current_run["status"] = "done"
-            current_run["result"] = result
-            current_run["message"] = "Pipeline completed"
+        _run_state = RunState(status="done", message="Pipeline completed", result=result)
 
     except Exception as e:
-        with run_lock:
-            current_run["status"] = "error"
-            current_run["message"] = str(e)
-            current_run["result"] = {"error": str(e), "final_status": "ERROR"}
+        _run_state = RunState(status="error", message=str(e), result={"error": str(e), "final_status": "ERROR"})
 
         broadcast_event("error", {"message": str(e)})
 
 
+def _pipeline_worker():
+    """Persistent thread that runs queued pipeline jobs one at a time."""
+    global _run_active
+    while True:
+        job = _jobs.get()
+        try:
+            run_agent_background(*job)
+        finally:
+            _run_active = False
+
+
+_jobs = queue.SimpleQueue()
+if _IS_SERVER_PROCESS:
+    threading.Thread(target=_pipeline_worker, name="pipeline-worker", daemon=True).start()
+
+
 # ═══════════════════════════════════════════════════════════════════
 #  API ROUTES
 # ═══════════════════════════════════════════════════════════════════
@@ -103,11 +272,8 @@ def run_agent_background(repo_url, team_name, leader_name):
 @app.route("/api/run", methods=["POST"])
 def start_run():
     """Start the agent pipeline."""
-    global current_run
-
-    with run_lock:
-        if current_run["status"] == "running":
-            return jsonify({"error": "Agent is already running"}), 409
+    if _run_active:
+        return jsonify({"error": "Agent is already running"}), 409
 
     data = request.get_json()
     repo_url = data.get("repo_url", "").strip()
@@ -121,13 +287,12 @@ def start_run():
     if not leader_name:
         return jsonify({"error": "leader_name is required"}), 400
 
-    # Start pipeline in background thread
-    thread = threading.Thread(
-        target=run_agent_background,
-        args=(repo_url, team_name, leader_name),
-        daemon=True,
-    )
-    thread.start()
+    # Two requests can both get past the check above; only one wins this
+    if not _try_begin_run():
+        return jsonify({"error": "Agent is already running"}), 409
+
+    # Hand the run to the pipeline worker thread
+    _jobs.put((repo_url, team_name, leader_name))
 
     return jsonify({"message": "Agent started", "status": "running"}), 202
 
@@ -135,12 +300,17 @@ def start_run():
 @app.route("/api/status", methods=["GET"])
 def get_status():
     """Get the current run status (legacy polling endpoint)."""
-    with run_lock:
-        return jsonify({
-            "status": current_run["status"],
-            "message": current_run["message"],
-            "result": current_run["result"],
-        })
+    state = _run_state
+    return jsonify({
+        "status": state.status,
+        "message": state.message,
+        "result": state.result,
+    })
+
+
+def _overflow_frame(dropped: int) -> bytes:
+    """Named SSE event telling a client it fell behind and lost its oldest events."""
+    return b'event: overflow\ndata: {"dropped":%d}\n\n' % dropped
 
 
 @app.route("/api/events", methods=["GET"])
@@ -150,46 +320,92 @@ def sse_stream():
     The frontend connects here with EventSource to get real-time pipeline updates.
     Each event is a JSON object with a "type" field indicating the event kind.
     """
+    # One gzip stream per connection; its 32 KB window quickly fills with
+    # the repeated keys and event types, so later frames compress well
+    use_gzip = SSE_GZIP and "gzip" in request.headers.get("Accept-Encoding", "")
+
     def event_stream():
-        q = queue.Queue()
-        with sse_clients_lock:
-            sse_clients.append(q)
+        client = SSEClientBuffer()
+        gz = zlib.compressobj(1, zlib.DEFLATED, 31) if use_gzip else None
+        slot = sse_clients.add(client)
+        reported_dropped = 0
 
         try:
             while True:
-                try:
-                    # Block with timeout so we can detect disconnects
-                    data = q.get(timeout=30)
-                    yield f"data: {data}\n\n"
-                except queue.Empty:
-                    # Send a keep-alive comment to prevent connection timeout
-                    yield ": keepalive\n\n"
+                # Events that piled up go out as one write (bounded, so a
+                # backlog is sent in reasonably sized chunks)
+                frames = client.pop_many(SSE_MAX_FRAMES_PER_WRITE)
+                if frames:
+                    dropped = client.dropped
+                    if dropped != reported_dropped:
+                        # Tell the client it fell behind and lost the oldest events
+                        frames.insert(0, _overflow_frame(dropped - reported_dropped))
+                        reported_dropped = dropped
+                    chunk = b"".join(frames)
+                    if gz is not None:
+                        # Sync-flush so the browser can decode this chunk now
+                        chunk = gz.compress(chunk) + gz.flush(zlib.Z_SYNC_FLUSH)
+                    yield chunk
+                    continue
+                # Drained: clear, then re-check so a push between the last
+                # pop and the clear isn't missed
+                if client.rearm():
+                    continue
+                # Keepalives arrive as frames from the shared pump, which is
+                # also what surfaces a disconnect (the write fails)
+                client.ready.wait()
         except GeneratorExit:
             pass
         finally:
-            with sse_clients_lock:
-                if q in sse_clients:
-                    sse_clients.remove(q)
+            sse_clients.remove(slot)
+            client.clear()
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive",
+        "X-Accel-Buffering": "no",
+        "Vary": "Accept-Encoding",
+    }
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
 
     return Response(
         event_stream(),
         mimetype="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-        },
+        headers=headers,
     )
 
 
 @app.route("/api/results", methods=["GET"])
 def get_results():
     """Serve the latest results.json file."""
-    results_path = os.path.join(os.path.dirname(__file__), "workspace", "results.json")
-    if os.path.exists(results_path):
-        with open(results_path, "r", encoding="utf-8") as f:
-            return Response(f.read(), mimetype="application/json")
-    return jsonify({"error": "No results available yet"}), 404
+    try:
+        st = os.stat(RESULTS_PATH)
+    except OSError:
+        return jsonify({"error": "No results available yet"}), 404
+
+    if st.st_size > RESULTS_CACHE_MAX_BYTES:
+        # Werkzeug streams the file (sendfile under a capable server) and
+        # answers If-None-Match / If-Modified-Since with a bodiless 304
+        return send_file(RESULTS_PATH, mimetype="application/json", conditional=True, etag=True)
+
+    key = (st.st_mtime_ns, st.st_size)
+    with _results_cache_lock:
+        if _results_cache["key"] != key:
+            try:
+                with open(RESULTS_PATH, "rb") as f:
+                    _results_cache["bytes"] = f.read()
+            except OSError:
+                return jsonify({"error": "No results available yet"}), 404
+            _results_cache["key"] = key
+            _results_cache["etag"] = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+        body, etag = _results_cache["bytes"], _results_cache["etag"]
+
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    # Turns into a bodiless 304 when If-None-Match matches
+    return response.make_conditional(request)
 
 
 @app.route("/api/health", methods=["GET"])
@@ -198,6 +414,64 @@ def health():
     return jsonify({"status": "ok"})
 
 
+# ═══════════════════════════════════════════════════════════════════
+#  WSGI FAST PATH — health/status without Flask dispatch
+# ═══════════════════════════════════════════════════════════════════
+
+class FastPath:
+    """
+    WSGI middleware answering GET/HEAD /api/health and /api/status before
+    Flask's routing. Health is a constant; status is encoded once per
+    RunState snapshot. Anything else goes to the wrapped app, so the
+    Flask routes above still define the API — as do these two whenever
+    CORS_ORIGINS restricts origins.
+    """
+
+    _HEALTH = b'{"status":"ok"}'
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self._status_for = None
+        self._status_body = b""
+
+    @staticmethod
+    def _headers(body: bytes, origin: str) -> list:
+        # The CORS headers flask-cors adds under the wildcard policy: the
+        # request's Origin is echoed (with Vary), or "*" without one
+        headers = [("Content-Type", "application/json"), ("Content-Length", str(len(body)))]
+        if origin:
+            headers += [("Access-Control-Allow-Origin", origin), ("Vary", "Origin")]
+        else:
+            headers.append(("Access-Control-Allow-Origin", "*"))
+        return headers
+
+    def _status(self) -> bytes:
+        state = _run_state
+        if state is not self._status_for:
+            # Build before publishing, so a reader never pairs a new state
+            # with an old body
+            body = _dumps_event({"status": state.status, "message": state.message, "result": state.result})
+            self._status_body, self._status_for = body, state
+        return self._status_body
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        method = environ.get("REQUEST_METHOD", "GET")
+        if method in ("GET", "HEAD") and CORS_ORIGINS == "*":
+            if path == "/api/health":
+                body = self._HEALTH
+            elif path == "/api/status":
+                body = self._status()
+            else:
+                return self.wsgi_app(environ, start_response)
+            start_response("200 OK", self._headers(body, environ.get("HTTP_ORIGIN", "")))
+            return [b""] if method == "HEAD" else [body]
+        return self.wsgi_app(environ, start_response)
+
+
+app.wsgi_app = FastPath(app.wsgi_app)
+
+
 if __name__ == "__main__":
     # use_reloader=False prevents Flask from restarting when files in
     # workspace/ change during pipeline execution (clone, fix, etc.)
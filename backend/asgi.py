@@ -0,0 +1,124 @@
+"""
+ASGI entry point for the CI/CD Healing Agent API.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 1
+
+/api/events is served natively: each SSE client is a coroutine on the
+event loop instead of a server thread blocked for the life of the
+connection. Every other route is the Flask app from app.py, run through
+a2wsgi's WSGI bridge (which streams responses from a small thread pool).
+"""
+
+import asyncio
+import zlib
+
+from a2wsgi import WSGIMiddleware
+
+from app import (
+    app as flask_app,
+    sse_clients,
+    SSEClientBuffer,
+    CORS_ORIGINS,
+    SSE_GZIP,
+    SSE_MAX_FRAMES_PER_WRITE,
+    _overflow_frame,
+)
+
+# Allowed origins for the native SSE route, parsed like app.py's CORS()
+_CORS_ALLOWED = None if CORS_ORIGINS == "*" else frozenset(o.strip() for o in CORS_ORIGINS.split(","))
+
+_wsgi = WSGIMiddleware(flask_app)
+
+
+def _sse_headers(request_headers: dict, use_gzip: bool) -> list:
+    """Response headers for /api/events, matching the Flask route's (and flask-cors')."""
+    headers = [
+        (b"content-type", b"text/event-stream; charset=utf-8"),
+        (b"cache-control", b"no-cache"),
+        (b"x-accel-buffering", b"no"),
+        (b"vary", b"Accept-Encoding"),
+    ]
+    if use_gzip:
+        headers.append((b"content-encoding", b"gzip"))
+
+    origin = request_headers.get(b"origin")
+    if _CORS_ALLOWED is None:
+        headers.append((b"access-control-allow-origin", origin or b"*"))
+        if origin:
+            headers.append((b"vary", b"Origin"))
+    elif origin and origin.decode("latin-1") in _CORS_ALLOWED:
+        headers += [(b"access-control-allow-origin", origin), (b"vary", b"Origin")]
+    return headers
+
+
+async def _sse_stream(scope, receive, send):
+    """
+    Server-Sent Events endpoint (the async twin of app.sse_stream).
+
+    The dispatcher thread pushes frames into this client's buffer; its
+    waker schedules `wake` on the loop, so waiting costs no thread.
+    """
+    request_headers = dict(scope["headers"])
+    use_gzip = SSE_GZIP and b"gzip" in request_headers.get(b"accept-encoding", b"")
+
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+    disconnected = False
+
+    async def watch_disconnect():
+        nonlocal disconnected
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected = True
+        wake.set()
+
+    client = SSEClientBuffer(waker=lambda: loop.call_soon_threadsafe(wake.set))
+    gz = zlib.compressobj(1, zlib.DEFLATED, 31) if use_gzip else None
+    watcher = asyncio.ensure_future(watch_disconnect())
+    slot = sse_clients.add(client)
+    reported_dropped = 0
+
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": _sse_headers(request_headers, use_gzip)})
+        while not disconnected:
+            frames = client.pop_many(SSE_MAX_FRAMES_PER_WRITE)
+            if frames:
+                dropped = client.dropped
+                if dropped != reported_dropped:
+                    frames.insert(0, _overflow_frame(dropped - reported_dropped))
+                    reported_dropped = dropped
+                chunk = b"".join(frames)
+                if gz is not None:
+                    chunk = gz.compress(chunk) + gz.flush(zlib.Z_SYNC_FLUSH)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                continue
+            # Drained: clear, then re-check so a push in between isn't missed
+            wake.clear()
+            if client.rearm():
+                continue
+            await wake.wait()
+    finally:
+        sse_clients.remove(slot)
+        client.clear()
+        watcher.cancel()
+
+
+async def _lifespan(receive, send):
+    """Nothing to set up: app.py starts its threads on import."""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI application: native SSE, everything else through Flask."""
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+    elif scope["type"] == "http" and scope["path"] == "/api/events" and scope["method"] == "GET":
+        await _sse_stream(scope, receive, send)
+    else:
+        await _wsgi(scope, receive, send)
@@ -0,0 +1,61 @@
+"""Tests for the ast-based unused-import scan in agent.deterministic_fixer."""
+
+import ast
+
+from agent.deterministic_fixer import _find_unused_imports, _parse_one
+
+
+def _unused(source: str) -> list:
+    return _find_unused_imports(ast.parse(source))
+
+
+def _unused_in_file(tmp_path, source: str) -> list:
+    path = tmp_path / "mod.py"
+    path.write_text(source, encoding="utf-8")
+    _, _, _, error, unused = _parse_one((str(path), "mod.py"), {})
+    assert error is None
+    return unused
+
+
+def test_reports_unused_import():
+    assert _unused("import os\nimport sys\n\nprint(sys.argv)\n") == [[1, "os"]]
+
+
+def test_type_checking_import_used_in_quoted_annotation():
+    source = (
+        "from typing import TYPE_CHECKING\n"
+        "if TYPE_CHECKING:\n"
+        "    from foo import Bar\n"
+        "\n"
+        "def f(x: \"Bar\") -> None:\n"
+        "    return None\n"
+    )
+    assert _unused(source) == []
+
+
+def test_names_nested_in_quoted_annotations_count_as_used():
+    source = (
+        "from typing import List\n"
+        "from foo import Bar, Baz\n"
+        "\n"
+        "def f() -> \"List[Bar]\":\n"
+        "    pass\n"
+        "\n"
+        "y: List[\"Baz\"] = []\n"
+    )
+    assert _unused(source) == []
+
+
+def test_names_in_type_comments_count_as_used(tmp_path):
+    source = (
+        "from foo import Bar\n"
+        "from foo import Baz\n"
+        "import os  # type: ignore\n"
+        "\n"
+        "def f(a, b):\n"
+        "    # type: (int, Bar) -> None\n"
+        "    pass\n"
+        "\n"
+        "x = []  # type: list[Baz]\n"
+    )
+    assert _unused_in_file(tmp_path, source) == [[3, "os"]]
@@ -73,54 +73,60 @@ function AppInner() {
     const es = new EventSource(`${API_BASE}/api/events`)
     eventSourceRef.current = es
 
+    const handleEvent = (data) => {
+      console.log('[SSE]', data.type, data)
+
+      if (data.message) {
+        setStatusMessage(data.message)
+      }
+
+      setEvents(prev => [...prev, { ...data, _ts: new Date().toLocaleTimeString() }])
+
+      // Track CI/CD iterations
+      if (data.type === 'iteration_start' || data.type === 'iteration_complete' || data.type === 'test_result') {
+        setCiRuns(prev => {
+          const updated = [...prev]
+          if (data.type === 'iteration_start') {
+            updated.push({
+              iteration: data.iteration || updated.length + 1,
+              status: 'running',
+              timestamp: new Date().toLocaleTimeString(),
+              passed: 0,
+              failed: 0,
+            })
+          } else if (data.type === 'test_result') {
+            if (updated.length > 0) {
+              updated[updated.length - 1].passed = data.passed || 0
+              updated[updated.length - 1].failed = data.failed || 0
+              updated[updated.length - 1].status = data.failed > 0 ? 'failed' : 'passed'
+            }
+          } else if (data.type === 'iteration_complete') {
+            if (updated.length > 0) {
+              updated[updated.length - 1].status = data.all_passed ? 'passed' : 'failed'
+              updated[updated.length - 1].fixes_applied = data.fixes_applied || 0
+            }
+          }
+          return updated
+        })
+      }
+
+      // Handle terminal events
+      if (data.type === 'done') {
+        setIsRunning(false)
+        setFinalResult(data.result || data)
+        es.close()
+      } else if (data.type === 'error') {
+        setIsRunning(false)
+        es.close()
+      }
+    }
+
     es.onmessage = (event) => {
       try {
         const data = JSON.parse(event.data)
-        console.log('[SSE]', data.type, data)
-
-        if (data.message) {
-          setStatusMessage(data.message)
-        }
-
-        setEvents(prev => [...prev, { ...data, _ts: new Date().toLocaleTimeString() }])
-
-        // Track CI/CD iterations
-        if (data.type === 'iteration_start' || data.type === 'iteration_complete' || data.type === 'test_result') {
-          setCiRuns(prev => {
-            const updated = [...prev]
-            if (data.type === 'iteration_start') {
-              updated.push({
-                iteration: data.iteration || updated.length + 1,
-                status: 'running',
-                timestamp: new Date().toLocaleTimeString(),
-                passed: 0,
-                failed: 0,
-              })
-            } else if (data.type === 'test_result') {
-              if (updated.length > 0) {
-                updated[updated.length - 1].passed = data.passed || 0
-                updated[updated.length - 1].failed = data.failed || 0
-                updated[updated.length - 1].status = data.failed > 0 ? 'failed' : 'passed'
-              }
-            } else if (data.type === 'iteration_complete') {
-              if (updated.length > 0) {
-                updated[updated.length - 1].status = data.all_passed ? 'passed' : 'failed'
-                updated[updated.length - 1].fixes_applied = data.fixes_applied || 0
-              }
-            }
-            return updated
-          })
-        }
-
-        // Handle terminal events
-        if (data.type === 'done') {
-          setIsRunning(false)
-          setFinalResult(data.result || data)
-          es.close()
-        } else if (data.type === 'error') {
-          setIsRunning(false)
-          es.close()
-        }
+        // The backend groups bursts of events into one "batch" message
+        const batch = data.type === 'batch' ? data.events : [data]
+        batch.forEach(handleEvent)
       } catch (err) {
         console.error('[SSE] Parse error:', err)
       }